@@ -0,0 +1,149 @@
+"""Cold storage for old chat messages.
+
+``archive_messages`` moves messages older than a cutoff out of the Message
+table into segments: gzipped JSONL files of up to SEGMENT_SIZE messages in
+id order, each indexed by an ArchiveSegment row with its id range. Segment
+files are written to a temporary name and renamed into place, and never
+touched again, so readers can cache them freely.
+
+``archived_before`` reads them back as unsaved Message instances, which is
+how the history API keeps scrolling once it runs past the hot table.
+Archived messages keep their rows in the search index.
+"""
+import gzip
+import json
+import os
+import tempfile
+from datetime import timedelta
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core.cache import bump_version
+
+from .models import ArchiveSegment, ArchivedImage, Message
+
+SEGMENT_SIZE = 1000
+
+
+def archive_cutoff():
+    return timezone.now() - timedelta(days=settings.CHAT_ARCHIVE_AFTER_DAYS)
+
+
+def record(msg):
+    return {
+        'id': msg.id,
+        'user_id': msg.user_id,
+        'user': msg.user.username,
+        'content': msg.content,
+        'image': msg.image.name if msg.image else '',
+        'timestamp': msg.timestamp.isoformat(),
+    }
+
+
+def write_segment(name, records):
+    os.makedirs(settings.CHAT_ARCHIVE_DIR, exist_ok=True)
+    path = os.path.join(settings.CHAT_ARCHIVE_DIR, name)
+    fd, tmp_path = tempfile.mkstemp(dir=settings.CHAT_ARCHIVE_DIR, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb') as out:
+            for item in records:
+                out.write(json.dumps(item, ensure_ascii=False).encode() + b'\n')
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return path
+
+
+def archive_segment(cutoff, size=SEGMENT_SIZE):
+    """Move the oldest ``size`` messages before ``cutoff`` into a new segment.
+
+    Returns the segment, or None when there is nothing left to archive.
+    """
+    with transaction.atomic():
+        messages = list(
+            Message.objects.select_related('user').filter(timestamp__lt=cutoff).order_by('id')[:size]
+        )
+        if not messages:
+            return None
+        first, last = messages[0], messages[-1]
+        name = f'{first.id:010d}-{last.id:010d}.jsonl.gz'
+        path = write_segment(name, (record(msg) for msg in messages))
+        try:
+            segment = ArchiveSegment.objects.create(
+                first_id=first.id,
+                last_id=last.id,
+                first_timestamp=first.timestamp,
+                last_timestamp=last.timestamp,
+                count=len(messages),
+                name=name,
+            )
+            ArchivedImage.objects.bulk_create(
+                ArchivedImage(segment=segment, name=image)
+                for image in sorted({msg.image.name for msg in messages if msg.image})
+            )
+            # Raw, without a post_delete per row: the messages stay in the
+            # search index (they are still part of the history), their images
+            # are kept by ArchivedImage, nothing else points at them, and the
+            # chat caches are invalidated once below
+            Message.objects.filter(id__in=[msg.id for msg in messages])._raw_delete(Message.objects.db)
+            bump_version('chat')
+        except BaseException:
+            os.remove(path)
+            raise
+    return segment
+
+
+def archive_messages(cutoff=None, size=SEGMENT_SIZE):
+    """Archive everything before ``cutoff``; returns the new segments."""
+    cutoff = cutoff or archive_cutoff()
+    segments = []
+    while segment := archive_segment(cutoff, size):
+        segments.append(segment)
+    return segments
+
+
+@lru_cache(maxsize=16)
+def read_segment(path):
+    with gzip.open(path, 'rt', encoding='utf-8') as lines:
+        return tuple(json.loads(line) for line in lines)
+
+
+def to_message(item):
+    return Message(
+        id=item['id'],
+        user=User(id=item['user_id'], username=item['user']),
+        content=item['content'],
+        image=item['image'] or None,
+        timestamp=parse_datetime(item['timestamp']),
+    )
+
+
+def archived_messages():
+    """Every archived message, oldest first."""
+    for segment in ArchiveSegment.objects.order_by('first_id').iterator():
+        for item in read_segment(segment.path):
+            yield to_message(item)
+
+
+def archived_before(message_id, limit):
+    """Up to ``limit`` archived messages older than ``message_id``, newest first.
+
+    ``message_id`` None starts from the newest archived message.
+    """
+    segments = ArchiveSegment.objects.order_by('-first_id')
+    if message_id is not None:
+        segments = segments.filter(first_id__lt=message_id)
+    messages = []
+    for segment in segments:
+        for item in reversed(read_segment(segment.path)):
+            if message_id is None or item['id'] < message_id:
+                messages.append(to_message(item))
+                if len(messages) == limit:
+                    return messages
+    return messages
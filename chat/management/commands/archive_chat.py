@@ -0,0 +1,29 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from chat.archive import SEGMENT_SIZE, archive_messages
+
+
+class Command(BaseCommand):
+    help = "Move old chat messages into compressed archive segments"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.CHAT_ARCHIVE_AFTER_DAYS,
+                            help="Archive messages older than this many days")
+        parser.add_argument('--segment-size', type=int, default=SEGMENT_SIZE, help="Messages per segment")
+        parser.add_argument('--every', type=float,
+                            help="Keep running, archiving again every this many hours")
+
+    def handle(self, *args, **options):
+        while True:
+            cutoff = timezone.now() - timedelta(days=options['days'])
+            segments = archive_messages(cutoff, options['segment_size'])
+            moved = sum(segment.count for segment in segments)
+            self.stdout.write(f"Archived {moved} message(s) into {len(segments)} segment(s)")
+            if not options['every']:
+                return
+            time.sleep(options['every'] * 3600)
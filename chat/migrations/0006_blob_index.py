@@ -0,0 +1,42 @@
+# Generated by Django 6.0.2 on 2026-10-18 18:39
+
+import core.storage
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def split_images(apps, schema_editor):
+    ArchiveSegment = apps.get_model('chat', 'ArchiveSegment')
+    ArchivedImage = apps.get_model('chat', 'ArchivedImage')
+    for segment in ArchiveSegment.objects.exclude(images='').iterator():
+        ArchivedImage.objects.bulk_create(
+            ArchivedImage(segment=segment, name=name) for name in segment.images.split('\n') if name
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0005_archivesegment'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='message',
+            name='image',
+            field=models.ImageField(blank=True, db_index=True, null=True, storage=core.storage.ContentAddressedStorage(), upload_to='chat_images/'),
+        ),
+        migrations.CreateModel(
+            name='ArchivedImage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(db_index=True, max_length=100)),
+                ('segment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='images', to='chat.archivesegment')),
+            ],
+        ),
+        migrations.RunPython(split_images, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='archivesegment',
+            name='images',
+        ),
+    ]
@@ -1,14 +1,61 @@
+import os
+
+from django.conf import settings
 from django.db import models
 from django.contrib.auth.models import User
+from core.storage import blob_storage
 
 class Message(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     content = models.TextField(blank=True) # Content can be empty if there's an image
-    image = models.ImageField(upload_to='chat_images/', null=True, blank=True)
+    image = models.ImageField(upload_to='chat_images/', storage=blob_storage, null=True, blank=True, db_index=True)
     timestamp = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ['timestamp']
+        indexes = [
+            # Keyset pagination cursor for history scrolling
+            models.Index(fields=['timestamp', 'id'], name='chat_message_ts_id_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username}: {self.content}"
+
+
+class ArchiveSegment(models.Model):
+    """A gzipped JSONL file of old messages moved out of the Message table.
+
+    Written once by ``manage.py archive_chat`` and never modified; see
+    chat/archive.py.
+    """
+    first_id = models.PositiveBigIntegerField(unique=True)
+    last_id = models.PositiveBigIntegerField()
+    first_timestamp = models.DateTimeField()
+    last_timestamp = models.DateTimeField()
+    count = models.PositiveIntegerField()
+    name = models.CharField(max_length=100)  # Relative to CHAT_ARCHIVE_DIR
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['first_id']
+
+    def __str__(self):
+        return f"Messages {self.first_id}-{self.last_id} ({self.count})"
+
+    @property
+    def path(self):
+        return os.path.join(settings.CHAT_ARCHIVE_DIR, self.name)
+
+
+
+class ArchivedImage(models.Model):
+    """An image sent in an archived message: the blob must outlive the row."""
+    segment = models.ForeignKey(ArchiveSegment, on_delete=models.CASCADE, related_name='images')
+    name = models.CharField(max_length=100, db_index=True)
+
+    def __str__(self):
+        return self.name
+
+    @classmethod
+    def references_blob(cls, name):
+        return cls.objects.filter(name=name).exists()
@@ -0,0 +1,56 @@
+import asyncio
+import threading
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class LocalBroker:
+    """In-process fan-out of "new message" notifications to open chat streams.
+
+    Every worker process has its own broker, so a stream only gets woken up by
+    messages sent through the same process. Streams re-check the database on
+    each keepalive, which still delivers messages posted on other workers (just
+    later). A shared broker only needs the same ``subscribe``/``unsubscribe``/
+    ``publish`` methods and can be selected with the ``CHAT_BROKER`` setting.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+
+    def subscribe(self):
+        subscription = (asyncio.get_running_loop(), asyncio.Event())
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, message_id):
+        # Called from sync views running in worker threads, so wake each
+        # subscriber on its own event loop.
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for loop, event in subscribers:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # Loop already closed, the stream is going away anyway
+                self.unsubscribe((loop, event))
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                path = getattr(settings, 'CHAT_BROKER', 'chat.pubsub.LocalBroker')
+                _broker = import_string(path)()
+    return _broker
@@ -1,3 +1,137 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
 
-# Create your tests here.
+from django.core.management import call_command
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core.cache import get_version
+from core.testing import QueryBudgetTestCase, SEED_MESSAGES
+from search import index
+from .archive import archive_messages
+from .models import ArchiveSegment, Message
+from .views import PAGE_SIZE
+
+
+class ChatQueryBudgetTests(QueryBudgetTestCase):
+    @classmethod
+    def seed(cls):
+        Message.objects.bulk_create(
+            Message(user=cls.user if i % 2 else cls.other, content=f"Mensaje {i}")
+            for i in range(SEED_MESSAGES)
+        )
+        ids = list(Message.objects.order_by('id').values_list('id', flat=True))
+        cls.first_id, cls.middle_id, cls.last_id = ids[0], ids[len(ids) // 2], ids[-1]
+
+    def test_latest_page(self):
+        response = self.assertBudget(2, reverse('get_messages'))
+        self.assertEqual(len(response.json()['messages']), PAGE_SIZE)
+
+    def test_latest_page_cached(self):
+        self.client.get(reverse('get_messages'))
+        self.assertBudget(1, reverse('get_messages'))
+
+    def test_delta(self):
+        self.assertBudget(2, reverse('get_messages'), data={'since': self.last_id - 10})
+
+    def test_delta_nothing_new(self):
+        self.assertBudget(2, reverse('get_messages'), data={'since': self.last_id}, status=204)
+
+    def test_history_page(self):
+        # Keyset seek: a page from the middle of the history costs the same as the newest
+        self.assertBudget(3, reverse('get_messages'), data={'before': self.middle_id, 'limit': 100})
+
+    def test_send(self):
+        self.assertBudget(2, reverse('send_message'), 'post', {'content': 'Hola'})
+
+    def test_stream(self):
+        # Under WSGI the stream ends at once with what is new, like a poll
+        response = self.assertBudget(1, reverse('stream_messages'), data={'since': self.last_id - 3})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertFalse(response.streaming)
+        body = response.content.decode()
+        self.assertTrue(body.startswith('retry: '))
+        self.assertEqual(body.count('\ndata: '), 3)
+        self.assertIn(f'id: {self.last_id}\n', body)
+
+    async def test_stream_asgi(self):
+        # Under ASGI it stays open; only the response is set up here, the
+        # event stream itself is lazy
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('stream_messages'))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertTrue(response.streaming)
+
+
+class ChatArchiveTests(QueryBudgetTestCase):
+    @classmethod
+    def seed(cls):
+        Message.objects.bulk_create(
+            Message(user=cls.user if i % 2 else cls.other, content=f"Mensaje {i}")
+            for i in range(250)
+        )
+        cls.ids = list(Message.objects.order_by('id').values_list('id', flat=True))
+        # The oldest 150 are old enough to archive
+        Message.objects.filter(id__in=cls.ids[:150]).update(timestamp=timezone.now() - timedelta(days=365))
+
+    def setUp(self):
+        super().setUp()
+        archive_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, archive_dir, ignore_errors=True)
+        override = override_settings(CHAT_ARCHIVE_DIR=archive_dir)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_archive(self):
+        call_command('archive_chat', '--segment-size', '100', stdout=StringIO())
+        self.assertEqual(Message.objects.count(), 100)
+        segments = list(ArchiveSegment.objects.values_list('first_id', 'last_id', 'count'))
+        self.assertEqual(segments, [(self.ids[0], self.ids[99], 100), (self.ids[100], self.ids[149], 50)])
+
+    def test_history_reads_through_archive(self):
+        call_command('archive_chat', '--segment-size', '100', stdout=StringIO())
+        # Hot rows first, then the newest archive segment
+        response = self.assertBudget(4, reverse('get_messages'), data={'before': self.ids[160], 'limit': 20})
+        data = response.json()
+        self.assertEqual([msg['id'] for msg in data['messages']], self.ids[140:160])
+        self.assertTrue(data['has_more'])
+        self.assertEqual(data['messages'][0]['content'], "Mensaje 140")
+
+        # Entirely archived, across both segments
+        response = self.assertBudget(3, reverse('get_messages'), data={'before': self.ids[110], 'limit': 20})
+        self.assertEqual([msg['id'] for msg in response.json()['messages']], self.ids[90:110])
+
+    def test_archive_bumps_version_once(self):
+        version = get_version('chat')
+        # Per segment: select, segment row, one delete and one version bump,
+        # in a savepoint (no images to record); then the last, empty select
+        with self.assertNumQueries(2 * 6 + 3):
+            archive_messages(size=100)
+        self.assertEqual(get_version('chat'), version + 2)
+
+    def test_history_from_deleted_cursor(self):
+        call_command('archive_chat', '--segment-size', '100', stdout=StringIO())
+        # The oldest message the client has was deleted by its author since
+        Message.objects.filter(id=self.ids[200]).delete()
+        response = self.assertBudget(3, reverse('get_messages'), data={'before': self.ids[200], 'limit': 20})
+        self.assertEqual([msg['id'] for msg in response.json()['messages']], self.ids[180:200])
+
+        # Only archived messages left before it
+        Message.objects.filter(id=self.ids[150]).delete()
+        response = self.assertBudget(3, reverse('get_messages'), data={'before': self.ids[150], 'limit': 20})
+        self.assertEqual([msg['id'] for msg in response.json()['messages']], self.ids[130:150])
+
+    def test_archived_still_searchable(self):
+        old = Message.objects.get(id=self.ids[0])
+        old.content = "Receta de la abuela"
+        old.save()
+        call_command('archive_chat', '--segment-size', '100', stdout=StringIO())
+        self.assertFalse(Message.objects.filter(id=old.id).exists())
+        self.assertEqual([hit['id'] for hit in index.search('abuela')['message']], [old.id])
+
+        # And after rebuilding the index from scratch
+        index.rebuild()
+        self.assertEqual([hit['id'] for hit in index.search('abuela')['message']], [old.id])
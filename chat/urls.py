@@ -4,4 +4,5 @@ from . import views
 urlpatterns = [
     path('get/', views.get_messages, name='get_messages'),
     path('send/', views.send_message, name='send_message'),
+    path('stream/', views.stream_messages, name='stream_messages'),
 ]
@@ -1,33 +1,180 @@
 from django.shortcuts import render
-from django.http import JsonResponse
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.csrf import csrf_exempt
+from django.db import transaction
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIRequest
+from asgiref.sync import sync_to_async
+from .archive import archived_before
 from .models import Message
+from .pubsub import get_broker
+from core.cache import FRAGMENT_TIMEOUT, conditional, versioned_key
+from core.thumbnails import variant_urls
+from core.tasks import queue_variants
+from core.uploadhandlers import image_uploads, upload_error
+from core.uploads import uploaded_image
+import asyncio
 import json
 
+PAGE_SIZE = 50
+MAX_HISTORY_PAGE = 100
+KEEPALIVE_SECONDS = 15
+# How soon EventSource reconnects once a stream ends; under WSGI, where every
+# stream ends right away, this is the polling interval
+STREAM_RETRY_MS = 3000
+
+def serialize_message(msg, user):
+    return {
+        'id': msg.id,
+        'user': msg.user.username,
+        'is_user': msg.user_id == user.id,
+        'content': msg.content,
+        'image_url': msg.image.url if msg.image else None,
+        'image_variants': variant_urls(msg.image) if msg.image else None,
+        'timestamp': msg.timestamp.isoformat()
+    }
+
+def messages_after(message_id):
+    return list(
+        Message.objects.select_related('user').filter(id__gt=message_id).order_by('id')[:PAGE_SIZE]
+    )
+
+def serialized_messages_after(message_id, user):
+    return [serialize_message(msg, user) for msg in messages_after(message_id)]
+
+def messages_before(message_id, limit):
+    # Keyset pagination on (timestamp, id): seek to the cursor row in the index
+    # and read the next page backwards, no OFFSET involved. If its author
+    # deleted the cursor row, the nearest older row stands in for it (and is
+    # part of the page); no row at all means the rest is in the archive.
+    cursor = Message.objects.filter(id__lte=message_id).order_by('-id').values('timestamp', 'id').first()
+    if cursor is None:
+        return []
+    return list(
+        Message.objects.select_related('user')
+        .filter(timestamp__lte=cursor['timestamp'])
+        .exclude(timestamp=cursor['timestamp'], id__gt=cursor['id'])
+        .exclude(id=message_id)
+        .order_by('-timestamp', '-id')[:limit]
+    )
+
+def latest_message_id():
+    return Message.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+def message_payload(user, since, before, limit):
+    if since is not None:
+        # Delta sync: only rows newer than the last id the client already has
+        return {'messages': serialized_messages_after(since, user)}
+
+    if before is not None:
+        # History page: older messages than the oldest one the client has
+        page = messages_before(before, limit + 1)
+    else:
+        page = list(Message.objects.select_related('user').order_by('-timestamp', '-id')[:limit + 1])
+    if len(page) < limit + 1:
+        # Ran out of the hot table: carry on into the archive
+        page += archived_before(page[-1].id if page else before, limit + 1 - len(page))
+
+    has_more = len(page) > limit
+    data = [serialize_message(msg, user) for msg in reversed(page[:limit])]
+    return {'messages': data, 'has_more': has_more}
+
 @login_required
+@conditional('chat')
 def get_messages(request):
-    messages = Message.objects.select_related('user').order_by('-timestamp')[:50]
-    data = [
-        {
-            'id': msg.id,
-            'user': msg.user.username,
-            'is_user': msg.user == request.user,
-            'content': msg.content,
-            'image_url': msg.image.url if msg.image else None,
-            'timestamp': msg.timestamp.isoformat()
-        } for msg in reversed(messages)
-    ]
-    return JsonResponse({'messages': data})
+    since = request.GET.get('since')
+    before = request.GET.get('before')
+    try:
+        since = int(since) if since is not None else None
+        before = int(before) if before is not None else None
+        limit = min(int(request.GET.get('limit', PAGE_SIZE)), MAX_HISTORY_PAGE)
+    except ValueError:
+        return JsonResponse({'status': 'error'}, status=400)
+    if limit < 1:
+        return JsonResponse({'status': 'error'}, status=400)
+
+    # Polls repeat the same few requests, so cache each user's responses
+    # until the next message bumps the chat version
+    key = versioned_key('chat', 'messages', request.user.id, since, before, limit, request=request)
+    data = cache.get(key)
+    if data is None:
+        data = message_payload(request.user, since, before, limit)
+        cache.set(key, data, FRAGMENT_TIMEOUT)
+
+    if since is not None and not data['messages']:
+        return HttpResponse(status=204)
+    return JsonResponse(data)
+
+def message_event(msg):
+    return f"id: {msg['id']}\ndata: {json.dumps(msg)}\n\n"
+
+async def message_events(user, last_id):
+    broker = get_broker()
+    subscription = broker.subscribe()
+    _, wakeup = subscription
+    try:
+        yield f"retry: {STREAM_RETRY_MS}\n\n"
+        while True:
+            # Clear before querying so a publish that lands mid-query isn't lost
+            wakeup.clear()
+            messages = await sync_to_async(serialized_messages_after)(last_id, user)
+            for msg in messages:
+                last_id = msg['id']
+                yield message_event(msg)
+            if len(messages) == PAGE_SIZE:
+                continue
+            try:
+                await asyncio.wait_for(wakeup.wait(), KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+    finally:
+        broker.unsubscribe(subscription)
+
+@login_required
+async def stream_messages(request):
+    user = await request.auser()
+    # EventSource sends Last-Event-ID when it reconnects
+    last_id = request.headers.get('Last-Event-ID') or request.GET.get('since')
+    try:
+        last_id = int(last_id)
+    except (TypeError, ValueError):
+        last_id = await sync_to_async(latest_message_id)()
+
+    if not isinstance(request, ASGIRequest):
+        # A WSGI server would hold a thread for as long as the stream stays
+        # open (and Django would try to buffer it whole): send what is new
+        # and end, and EventSource comes back after STREAM_RETRY_MS
+        messages = await sync_to_async(serialized_messages_after)(last_id, user)
+        body = f"retry: {STREAM_RETRY_MS}\n\n" + ''.join(message_event(msg) for msg in messages)
+        response = HttpResponse(body, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        return response
+
+    response = StreamingHttpResponse(message_events(user, last_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
 @login_required
+@image_uploads
 @csrf_exempt
 def send_message(request):
     if request.method == 'POST':
+        error = upload_error(request)
+        if error:
+            return JsonResponse({'status': 'error', 'error': error}, status=400)
         content = request.POST.get('content', '')
-        image = request.FILES.get('image')
+        image = uploaded_image(request)
 
         if content or image:
-            Message.objects.create(user=request.user, content=content, image=image)
+            try:
+                message = Message.objects.create(user=request.user, content=content, image=image)
+            finally:
+                if image:
+                    image.close()
+            if message.image:
+                queue_variants(message.image)
+            transaction.on_commit(lambda: get_broker().publish(message.id))
             return JsonResponse({'status': 'ok'})
     return JsonResponse({'status': 'error'}, status=400)
@@ -3,3 +3,10 @@ from django.apps import AppConfig
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from . import auth, cache, selection, tasks
+        selection.connect_signals()
+        cache.connect_signals()
+        auth.connect_signals()
+        tasks.connect_signals()
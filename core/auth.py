@@ -0,0 +1,66 @@
+"""A short-lived cache of the logged-in user.
+
+Django loads ``request.user`` from the database on every request. Here the
+user is kept in the cache for USER_CACHE_TIMEOUT seconds and only trusted
+while its session auth hash still matches the one in the session. Saves,
+deletes and logouts drop the entry right away. With a per-process cache
+(CACHE_BACKEND=locmem), other processes may keep honouring the old
+password's sessions until the entry expires.
+"""
+from asgiref.sync import sync_to_async
+from django.contrib import auth
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.auth.signals import user_logged_out
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.utils.crypto import constant_time_compare
+
+USER_CACHE_TIMEOUT = 60
+
+
+def _user_key(user_id):
+    return f'auth-user:{user_id}'
+
+
+def cache_user(user):
+    cache.set(_user_key(user.pk), user, USER_CACHE_TIMEOUT)
+
+
+def get_user(request):
+    """``django.contrib.auth.get_user``, served from the cache when possible."""
+    session = request.session
+    user_id = session.get(SESSION_KEY)
+    session_hash = session.get(HASH_SESSION_KEY)
+    if user_id is None or session_hash is None or BACKEND_SESSION_KEY not in session:
+        return auth.get_user(request)
+
+    user = cache.get(_user_key(user_id))
+    if user is not None and str(user.pk) == str(user_id) and user.is_active \
+            and constant_time_compare(session_hash, user.get_session_auth_hash()):
+        return user
+
+    # Missing, stale or not matching: the full check, which also logs out
+    # sessions whose hash is no longer valid
+    user = auth.get_user(request)
+    if not isinstance(user, AnonymousUser):
+        cache_user(user)
+    return user
+
+
+async def aget_user(request):
+    if not hasattr(request, '_acached_user'):
+        request._acached_user = await sync_to_async(get_user)(request)
+    return request._acached_user
+
+
+def forget_user(sender, instance=None, user=None, **kwargs):
+    user = instance or user
+    if user is not None and user.pk is not None:
+        cache.delete(_user_key(user.pk))
+
+
+def connect_signals():
+    post_save.connect(forget_user, sender='auth.User', dispatch_uid='auth-user-save')
+    post_delete.connect(forget_user, sender='auth.User', dispatch_uid='auth-user-delete')
+    user_logged_out.connect(forget_user, dispatch_uid='auth-user-logout')
@@ -0,0 +1,338 @@
+"""Export and import of the whole shared space as one zip file.
+
+The zip holds ``manifest.json``, one ``data/<app.model>.jsonl`` per model
+(a JSON object per row) and ``media/<name>`` for every stored file the rows
+point to. Users are referenced by username, so an export can be imported
+into a database where they have other ids (or other names, with a mapping).
+
+Both directions stream: ``export_chunks`` yields the zip piece by piece from
+``.iterator()`` querysets and file reads, and ``import_space`` reads rows back
+in batches for ``bulk_create``. Memory use doesn't grow with the data, only
+the zip directory (one small entry per file) and the watchlist item id map.
+The rows are all read from one snapshot (``snapshot``), so writes or an
+archive run during an export can't leave it pointing at rows it lacks.
+"""
+import io
+import json
+import os
+import shutil
+import zipfile
+from contextlib import ExitStack, contextmanager
+from datetime import date, datetime
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection, models, transaction
+from django.utils._os import safe_join
+
+from .cache import VERSIONED_MODELS, bump_version
+
+FORMAT_VERSION = 1
+# Exported in this order, which is also the import order: reviews have to
+# come after the watchlist items they point to
+MODELS = [
+    'core.DailyPhrase',
+    'core.Announcement',
+    'core.MoodEntry',
+    'notes.Note',
+    'watchlist.WatchItem',
+    'watchlist.Review',
+    'gallery.Photo',
+    'chat.Message',
+]
+BATCH_SIZE = 1000
+# Yield once this much zip output has piled up
+CHUNK_SIZE = 256 * 1024
+
+
+class BackupError(Exception):
+    pass
+
+
+class ChunkSink(io.RawIOBase):
+    """Write-only, unseekable file that collects what the zip writer produces."""
+
+    def __init__(self):
+        self.chunks = []
+        self.size = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        self.size = 0
+        return data
+
+
+def _encode(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _user_fields(model):
+    return [field for field in model._meta.concrete_fields
+            if isinstance(field, models.ForeignKey) and field.related_model is User]
+
+
+def _relation_fields(model):
+    # Foreign keys to other exported models, remapped to their new ids on import
+    return [field for field in model._meta.concrete_fields
+            if isinstance(field, models.ForeignKey) and field.related_model._meta.label in MODELS]
+
+
+def _file_fields(model):
+    return [field for field in model._meta.concrete_fields if isinstance(field, models.FileField)]
+
+
+def export_rows(label, usernames):
+    """Every row of ``label`` as a JSON-ready dict, oldest first."""
+    model = apps.get_model(label)
+    user_fields = {field.attname: field.name for field in _user_fields(model)}
+    relation_fields = {field.attname: field.name for field in _relation_fields(model)}
+    fields = [field.attname for field in model._meta.concrete_fields]
+
+    if label == 'chat.Message':
+        # Archived messages are part of the history too
+        from chat.archive import read_segment
+        from chat.models import ArchiveSegment
+        for segment in ArchiveSegment.objects.order_by('first_id').iterator():
+            for item in read_segment(segment.path):
+                yield {'id': item['id'], 'user': usernames.get(item['user_id'], item['user']),
+                       'content': item['content'], 'image': item['image'], 'timestamp': item['timestamp']}
+
+    for values in model.objects.order_by('pk').values(*fields).iterator(chunk_size=BATCH_SIZE):
+        row = {}
+        for attname, value in values.items():
+            if attname in user_fields:
+                row[user_fields[attname]] = usernames[value]
+            elif attname in relation_fields:
+                row[relation_fields[attname]] = value
+            else:
+                row[attname] = _encode(value)
+        yield row
+
+
+@contextmanager
+def snapshot():
+    """Read everything inside from one consistent view of the database.
+
+    SQLite connections here begin transactions with BEGIN IMMEDIATE
+    (shared_space/db.py), which would hold the write lock for the whole
+    export. A plain BEGIN is enough: under WAL its first read pins a
+    snapshot that later writers don't disturb and that doesn't block them.
+    """
+    if connection.in_atomic_block:
+        yield  # The caller's transaction already is one
+        return
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute('BEGIN DEFERRED')
+        try:
+            yield
+        finally:
+            # Nothing was written. The connection may have been closed under
+            # a stream that was abandoned, taking the transaction with it.
+            if connection.connection is not None and connection.connection.in_transaction:
+                with connection.cursor() as cursor:
+                    cursor.execute('ROLLBACK')
+        return
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY')
+        yield
+
+
+def export_chunks(include_media=True):
+    """The export zip, as a stream of bytes chunks."""
+    sink = ChunkSink()
+    media = set()
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED) as archive:
+        with snapshot():
+            usernames = dict(User.objects.values_list('id', 'username'))
+            archive.writestr('manifest.json', json.dumps({
+                'format': FORMAT_VERSION,
+                'created_at': datetime.now().isoformat(timespec='seconds'),
+                'models': MODELS,
+                'users': sorted(usernames.values()),
+            }, indent=2))
+            yield sink.drain()
+
+            for label in MODELS:
+                file_fields = [field.name for field in _file_fields(apps.get_model(label))]
+                with archive.open(f'data/{label}.jsonl', 'w', force_zip64=True) as out:
+                    for row in export_rows(label, usernames):
+                        out.write(json.dumps(row, ensure_ascii=False).encode() + b'\n')
+                        media.update(row[name] for name in file_fields if row.get(name))
+                        if sink.size >= CHUNK_SIZE:
+                            yield sink.drain()
+                yield sink.drain()
+
+        if include_media:
+            for name in sorted(media):
+                path = os.path.join(settings.MEDIA_ROOT, name)
+                try:
+                    info = zipfile.ZipInfo.from_file(path, f'media/{name}')
+                    src = open(path, 'rb')
+                except FileNotFoundError:
+                    continue  # Missing, or collected since the rows were read
+                # Images are compressed already
+                info.compress_type = zipfile.ZIP_STORED
+                with src, archive.open(info, 'w', force_zip64=True) as out:
+                    while chunk := src.read(CHUNK_SIZE):
+                        out.write(chunk)
+                        yield sink.drain()
+    yield sink.drain()
+
+
+@contextmanager
+def _keep_timestamps(model):
+    # bulk_create would otherwise stamp every row with the import time
+    fields = [field for field in model._meta.concrete_fields
+              if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def _batches(lines):
+    batch = []
+    for line in lines:
+        if line.strip():
+            batch.append(json.loads(line))
+            if len(batch) == BATCH_SIZE:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def import_space(path, user_map=None, include_media=True):
+    """Load an export zip into this database, next to whatever is already here.
+
+    ``user_map`` renames exported usernames ({'old': 'new'}); every user has
+    to exist already. Returns {label: rows imported}.
+    """
+    user_map = user_map or {}
+    counts = {}
+    with zipfile.ZipFile(path) as archive:
+        manifest = json.loads(archive.read('manifest.json'))
+        if manifest.get('format') != FORMAT_VERSION:
+            raise BackupError(f"Unsupported export format: {manifest.get('format')!r}")
+
+        user_ids = UserIds(user_map)
+        # Fail early for the users known up front; others (authors of archived
+        # chat messages) are looked up as they come
+        user_ids.require(manifest['users'])
+
+        with transaction.atomic(), ExitStack() as stack:
+            targets = {field.related_model._meta.label
+                       for label in MODELS for field in _relation_fields(apps.get_model(label))}
+            new_ids = {label: {} for label in targets}
+            for label in MODELS:
+                model = apps.get_model(label)
+                stack.enter_context(_keep_timestamps(model))
+                counts[label] = _import_model(archive, label, model, user_ids, new_ids)
+
+            if include_media:
+                _import_media(archive)
+
+            transaction.on_commit(_rebuild_derived)
+    return counts
+
+
+class UserIds:
+    """Exported username -> id of the user it maps to here."""
+
+    def __init__(self, user_map):
+        self.user_map = user_map
+        self.ids = {}
+
+    def require(self, names):
+        wanted = {name: self.user_map.get(name, name) for name in names}
+        found = dict(User.objects.filter(username__in=wanted.values()).values_list('username', 'id'))
+        missing = sorted(set(wanted.values()) - set(found))
+        if missing:
+            raise BackupError(f"Unknown users: {', '.join(missing)}")
+        self.ids.update((name, found[new]) for name, new in wanted.items())
+
+    def get(self, name):
+        if name not in self.ids:
+            self.require([name])
+        return self.ids[name]
+
+
+def _import_model(archive, label, model, user_ids, new_ids):
+    user_fields = [field.name for field in _user_fields(model)]
+    relation_fields = {field.name: field.related_model._meta.label for field in _relation_fields(model)}
+    fields = {field.name: field for field in model._meta.concrete_fields if not field.primary_key}
+
+    count = 0
+    with archive.open(f'data/{label}.jsonl') as raw:
+        for batch in _batches(io.TextIOWrapper(raw, encoding='utf-8')):
+            objects = []
+            for row in batch:
+                values = {}
+                for name, value in row.items():
+                    if name in user_fields:
+                        values[f'{name}_id'] = user_ids.get(value)
+                    elif name in relation_fields:
+                        values[f'{name}_id'] = _new_id(new_ids, label, row, name, relation_fields[name], value)
+                    elif name in fields:
+                        values[name] = fields[name].to_python(value)
+                objects.append(model(**values))
+            created = model.objects.bulk_create(objects, batch_size=BATCH_SIZE)
+            if label in new_ids:
+                new_ids[label].update(
+                    (row['id'], obj.pk) for row, obj in zip(batch, created)
+                )
+            count += len(created)
+    return count
+
+
+def _new_id(new_ids, label, row, name, target, value):
+    if value is None:
+        return None
+    try:
+        return new_ids[target][value]
+    except KeyError:
+        raise BackupError(f"{label} {row.get('id')}: {name} points to {target} {value}, which isn't in the export")
+
+
+def _import_media(archive):
+    for info in archive.infolist():
+        if not info.filename.startswith('media/') or info.is_dir():
+            continue
+        name = info.filename[len('media/'):]
+        path = safe_join(settings.MEDIA_ROOT, name)
+        if os.path.exists(path):
+            continue  # Content-addressed: same name, same bytes
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with archive.open(info) as src, open(path, 'wb') as dst:
+            shutil.copyfileobj(src, dst, CHUNK_SIZE)
+
+
+def _rebuild_derived():
+    from search import index
+
+    from .history import rebuild_mood_days
+
+    rebuild_mood_days()
+    if index.is_available():
+        index.rebuild()
+    for namespace in set(VERSIONED_MODELS.values()):
+        bump_version(namespace)
@@ -0,0 +1,153 @@
+import hashlib
+import time
+
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete
+from django.middleware.csrf import get_token
+from django.utils import timezone
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+
+from .models import CacheVersion
+
+# Cached pages and fragments are keyed by a per-app version that is bumped
+# whenever one of these models changes, so they never need to be deleted
+# explicitly. The counters live in the database (CacheVersion), so a change
+# made by any process (another web worker, the job runner, a management
+# command) is seen by all of them. The timeout is only a safety net for
+# changes made behind the ORM's back (bulk updates, raw SQL).
+VERSIONED_MODELS = {
+    'gallery.Photo': 'gallery',
+    'watchlist.WatchItem': 'watchlist',
+    'watchlist.Review': 'watchlist',
+    'notes.Note': 'notes',
+    'chat.Message': 'chat',
+}
+FRAGMENT_TIMEOUT = 60 * 60
+
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+
+def _create_version(namespace, modified=None):
+    # Start from the clock rather than 1 so a new database (tests, a fresh
+    # install next to an old file cache) can't hand out a version that old
+    # entries were keyed by
+    return CacheVersion.objects.get_or_create(
+        namespace=namespace, defaults={'version': _now_ms(), 'modified': modified},
+    )
+
+
+def _read_version(namespace):
+    row = CacheVersion.objects.filter(namespace=namespace).values_list('version', 'modified').first()
+    if row is None:
+        counter, _ = _create_version(namespace)
+        row = counter.version, counter.modified
+    return row
+
+
+def version_state(namespace, request=None):
+    """(version, last modified) of ``namespace``.
+
+    Read once per GET or HEAD ``request``, which the ETag, Last-Modified and
+    cache keys of a page then share. Other requests read it every time: they
+    may change the data and bump the version themselves.
+    """
+    if request is None or request.method not in ('GET', 'HEAD'):
+        return _read_version(namespace)
+    versions = request.__dict__.setdefault('_cache_versions', {})
+    if namespace not in versions:
+        versions[namespace] = _read_version(namespace)
+    return versions[namespace]
+
+
+def get_version(namespace, request=None):
+    return version_state(namespace, request)[0]
+
+
+def last_modified(namespace, request=None):
+    # None until the first change
+    return version_state(namespace, request)[1]
+
+
+def bump_version(namespace):
+    now = timezone.now()
+    # A single UPDATE, so concurrent bumps from several processes all count
+    if not CacheVersion.objects.filter(namespace=namespace).update(version=F('version') + 1, modified=now):
+        _, created = _create_version(namespace, now)
+        if not created:
+            CacheVersion.objects.filter(namespace=namespace).update(version=F('version') + 1, modified=now)
+
+
+def bump_version_for(label):
+    """Bump the version of the app caching ``label`` ("app.Model"), if any."""
+    namespace = VERSIONED_MODELS.get(label)
+    if namespace:
+        bump_version(namespace)
+
+
+def versioned_key(namespace, *parts, request=None):
+    return ':'.join(str(part) for part in (namespace, get_version(namespace, request)) + parts)
+
+
+def csrf_secret(request):
+    # Fragments containing {% csrf_token %} have to vary on the secret the
+    # tokens are derived from; get_token makes sure there is one.
+    get_token(request)
+    return request.META['CSRF_COOKIE']
+
+
+def fragment_context(request, namespace):
+    """Context for the {% cache %} blocks of an app's list page."""
+    return {
+        'cache_timeout': FRAGMENT_TIMEOUT,
+        'cache_version': get_version(namespace, request),
+        'csrf_secret': csrf_secret(request),
+    }
+
+
+def conditional(namespace, vary_csrf=False):
+    """Answer conditional GETs of an app's pages from its version counter.
+
+    The counter is in the database, so every process hands out the same
+    ETag and none answers 304 for content another one has changed. The ETag
+    also covers the user (pages and chat JSON are rendered for them) and,
+    for HTML with forms, the CSRF secret the embedded tokens come from.
+    Unchanged resources get a 304 without running the view. ``no-cache``
+    makes browsers (including fetch()) revalidate on every request instead
+    of guessing a freshness lifetime from Last-Modified.
+    """
+    def etag(request, *args, **kwargs):
+        if get_messages(request):
+            return None  # Render the page that shows them, never a 304
+        parts = [namespace, get_version(namespace, request), request.user.pk]
+        if vary_csrf:
+            parts.append(hashlib.sha256(csrf_secret(request).encode()).hexdigest()[:16])
+        return '-'.join(str(part) for part in parts)
+
+    def modified(request, *args, **kwargs):
+        if get_messages(request):
+            return None
+        return last_modified(namespace, request)
+
+    def decorator(view):
+        view = condition(etag_func=etag, last_modified_func=modified)(view)
+        return cache_control(private=True, no_cache=True)(view)
+    return decorator
+
+
+def invalidate(sender, **kwargs):
+    # After commit, otherwise a concurrent request could re-cache the old rows
+    # under the new version
+    label = sender._meta.label
+    transaction.on_commit(lambda: bump_version_for(label))
+
+
+def connect_signals():
+    for label in VERSIONED_MODELS:
+        post_save.connect(invalidate, sender=label, dispatch_uid=f'cache-save-{label}')
+        post_delete.connect(invalidate, sender=label, dispatch_uid=f'cache-delete-{label}')
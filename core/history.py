@@ -0,0 +1,100 @@
+from datetime import timedelta
+
+from django.db.models import F, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+from django.utils import timezone
+
+from .models import MoodDay, MoodEntry
+from .moods import MOODS, get_mood
+
+# period -> (bucket truncation, how many buckets back to show)
+PERIODS = {
+    'day': (None, 30),
+    'week': (TruncWeek, 12),
+    'month': (TruncMonth, 12),
+}
+
+
+def record_mood(entry):
+    """Count a new MoodEntry in its user's daily rollup row.
+
+    Called inside the same transaction as the insert so the rollup can't
+    drift from the raw entries.
+    """
+    mood = get_mood(entry.mood)
+    if mood is None:
+        return
+    day = timezone.localdate(entry.created_at)
+    bucket, created = MoodDay.objects.get_or_create(
+        user_id=entry.user_id, day=day, mood=mood.key, defaults={'count': 1}
+    )
+    if not created:
+        MoodDay.objects.filter(pk=bucket.pk).update(count=F('count') + 1)
+
+
+def rebuild_mood_days():
+    """Recompute every rollup row from the raw entries (e.g. after an import)."""
+    counts = {}
+    entries = MoodEntry.objects.values_list('user_id', 'mood', 'created_at')
+    for user_id, mood, created_at in entries.iterator():
+        mood = get_mood(mood)
+        if mood:
+            bucket = (user_id, timezone.localdate(created_at), mood.key)
+            counts[bucket] = counts.get(bucket, 0) + 1
+    MoodDay.objects.all().delete()
+    MoodDay.objects.bulk_create(
+        (MoodDay(user_id=user_id, day=day, mood=mood, count=count)
+         for (user_id, day, mood), count in counts.items()),
+        batch_size=1000,
+    )
+
+
+def period_start(period, today=None):
+    today = today or timezone.localdate()
+    _, span = PERIODS[period]
+    if period == 'day':
+        return today - timedelta(days=span - 1)
+    if period == 'week':
+        return today - timedelta(days=today.weekday(), weeks=span - 1)
+    month = today.month - (span - 1)
+    year = today.year + (month - 1) // 12
+    return today.replace(year=year, month=(month - 1) % 12 + 1, day=1)
+
+
+def distribution(user, period='day'):
+    """Mood counts per day/week/month bucket for ``user``, oldest first."""
+    trunc, _ = PERIODS[period]
+    rows = MoodDay.objects.filter(user=user, day__gte=period_start(period))
+    if trunc is not None:
+        rows = rows.annotate(bucket=trunc('day'))
+    else:
+        rows = rows.annotate(bucket=F('day'))
+    rows = rows.values('bucket', 'mood').annotate(n=Sum('count')).order_by('bucket')
+
+    buckets = {}
+    for row in rows:
+        start = row['bucket']
+        start = start.date() if hasattr(start, 'date') else start
+        counts = buckets.setdefault(start, dict.fromkeys(MOODS, 0))
+        counts[row['mood']] = counts.get(row['mood'], 0) + row['n']
+    return [
+        {'start': start, 'total': sum(counts.values()), 'counts': counts}
+        for start, counts in buckets.items()
+    ]
+
+
+def streaks(user, today=None):
+    """Current and longest run of consecutive days with at least one mood."""
+    today = today or timezone.localdate()
+    days = list(
+        MoodDay.objects.filter(user=user).order_by('day').values_list('day', flat=True).distinct()
+    )
+    longest = run = 0
+    previous = None
+    for day in days:
+        run = run + 1 if previous and day - previous == timedelta(days=1) else 1
+        longest = max(longest, run)
+        previous = day
+    # The current streak is still alive if the last entry was today or yesterday
+    current = run if previous and today - previous <= timedelta(days=1) else 0
+    return {'current': current, 'longest': longest, 'last_day': previous}
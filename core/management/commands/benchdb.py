@@ -0,0 +1,122 @@
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+
+from shared_space.db import SQLITE_TIMEOUT, sqlite_init_command
+
+# Django's stock SQLite settings: rollback journal, 5s timeout, deferred BEGIN
+PROFILES = {
+    'default': {'init_command': '', 'timeout': 5, 'begin': 'BEGIN'},
+    'tuned': {'init_command': sqlite_init_command(), 'timeout': SQLITE_TIMEOUT, 'begin': 'BEGIN IMMEDIATE'},
+}
+
+SCHEMA = """
+CREATE TABLE message (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    content TEXT NOT NULL,
+    timestamp REAL NOT NULL
+);
+CREATE INDEX message_ts_idx ON message (timestamp, id);
+"""
+
+
+def connect(path, profile):
+    conn = sqlite3.connect(path, timeout=profile['timeout'], isolation_level=None, check_same_thread=False)
+    for command in profile['init_command'].split(';'):
+        if command.strip():
+            conn.execute(command)
+    return conn
+
+
+def run_profile(profile, writers, readers, seconds):
+    """Hammer a fresh database with chat-like traffic for ``seconds``.
+
+    Writers mimic send_message (look up the latest id, then insert inside one
+    transaction); readers mimic the chat poll (newest page of messages).
+    """
+    fd, path = tempfile.mkstemp(suffix='.sqlite3')
+    os.close(fd)
+    try:
+        setup = connect(path, profile)
+        setup.executescript(SCHEMA)
+        setup.close()
+
+        counts = {'writes': 0, 'reads': 0, 'errors': 0}
+        lock = threading.Lock()
+        deadline = time.monotonic() + seconds
+
+        def count(key):
+            with lock:
+                counts[key] += 1
+
+        def writer(user_id):
+            conn = connect(path, profile)
+            while time.monotonic() < deadline:
+                try:
+                    conn.execute(profile['begin'])
+                    conn.execute("SELECT max(id) FROM message").fetchone()
+                    conn.execute(
+                        "INSERT INTO message (user_id, content, timestamp) VALUES (?, ?, ?)",
+                        (user_id, 'hola ' * 20, time.time()),
+                    )
+                    conn.execute("COMMIT")
+                    count('writes')
+                except sqlite3.OperationalError:
+                    # "database is locked"
+                    if conn.in_transaction:
+                        conn.execute("ROLLBACK")
+                    count('errors')
+            conn.close()
+
+        def reader():
+            conn = connect(path, profile)
+            while time.monotonic() < deadline:
+                try:
+                    conn.execute(
+                        "SELECT id, user_id, content FROM message ORDER BY timestamp DESC, id DESC LIMIT 50"
+                    ).fetchall()
+                    count('reads')
+                except sqlite3.OperationalError:
+                    count('errors')
+            conn.close()
+
+        threads = [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+        threads += [threading.Thread(target=reader) for _ in range(readers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        for suffix in ('', '-wal', '-shm', '-journal'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+    return {
+        'writes_per_sec': round(counts['writes'] / seconds, 1),
+        'reads_per_sec': round(counts['reads'] / seconds, 1),
+        'errors': counts['errors'],
+    }
+
+
+class Command(BaseCommand):
+    help = "Compare SQLite throughput with default vs tuned pragmas under concurrent writes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=4, help="Concurrent writing threads")
+        parser.add_argument('--readers', type=int, default=8, help="Concurrent polling threads")
+        parser.add_argument('--seconds', type=float, default=5.0, help="Duration of each run")
+        parser.add_argument('--profile', choices=sorted(PROFILES), action='append',
+                            help="Only run this profile (repeatable)")
+
+    def handle(self, *args, **options):
+        results = {}
+        for name in options['profile'] or PROFILES:
+            self.stderr.write(f"Running {name}...")
+            results[name] = run_profile(PROFILES[name], options['writers'], options['readers'], options['seconds'])
+        self.stdout.write(json.dumps(results, indent=2))
@@ -0,0 +1,20 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand
+
+from core.backup import export_chunks
+
+
+class Command(BaseCommand):
+    help = "Export every note, photo, message, mood etc. plus their media to a zip file"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help="Zip file to write (default shared-space-<time>.zip)")
+        parser.add_argument('--no-media', action='store_true', help="Leave out the image files")
+
+    def handle(self, *args, **options):
+        output = options['output'] or f"shared-space-{datetime.now():%Y%m%d-%H%M%S}.zip"
+        with open(output, 'wb') as out:
+            for chunk in export_chunks(include_media=not options['no_media']):
+                out.write(chunk)
+        self.stdout.write(f"Exported to {output}")
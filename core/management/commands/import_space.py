@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.backup import BackupError, import_space
+
+
+class Command(BaseCommand):
+    help = "Import a zip written by export_space, next to the existing data"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Zip file from export_space")
+        parser.add_argument('--user', action='append', default=[], metavar='OLD=NEW',
+                            help="Import OLD's rows as the existing user NEW (repeatable)")
+        parser.add_argument('--no-media', action='store_true', help="Skip the image files")
+
+    def handle(self, *args, **options):
+        user_map = {}
+        for mapping in options['user']:
+            old, sep, new = mapping.partition('=')
+            if not (sep and old and new):
+                raise CommandError(f"--user expects OLD=NEW, got {mapping!r}")
+            user_map[old] = new
+        try:
+            counts = import_space(options['path'], user_map, include_media=not options['no_media'])
+        except (BackupError, OSError) as error:
+            raise CommandError(str(error))
+        for label, count in counts.items():
+            self.stdout.write(f"{label}: {count}")
@@ -0,0 +1,327 @@
+import json
+import random
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+from http.cookiejar import CookieJar
+from io import BytesIO
+from pathlib import Path
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import HTTPCookieProcessor, HTTPRedirectHandler, Request, build_opener
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler, get_internal_wsgi_application
+from django.db import connection
+from django.test.utils import override_settings
+from PIL import Image
+
+from chat.models import Message
+from notes.models import Note
+from watchlist.models import WatchItem
+
+USERS = ('loadtest-a', 'loadtest-b')
+PASSWORD = 'loadtest'
+PERCENTILES = (50, 95, 99)
+
+
+class NoRedirect(HTTPRedirectHandler):
+    # Time each request on its own; a redirect after a POST is still a success
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = []
+
+    def add(self, action, seconds, ok):
+        with self._lock:
+            self.samples.append((action, seconds, ok))
+
+    def summary(self, duration):
+        by_action = {}
+        for action, seconds, ok in self.samples:
+            by_action.setdefault(action, []).append((seconds, ok))
+        by_action['all'] = [(seconds, ok) for _, seconds, ok in self.samples]
+        return {action: summarize(samples, duration) for action, samples in sorted(by_action.items())}
+
+
+def percentile(sorted_values, pct):
+    # Nearest-rank percentile
+    if not sorted_values:
+        return None
+    rank = max(int(round(pct / 100 * len(sorted_values))) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def summarize(samples, duration):
+    latencies = sorted(seconds * 1000 for seconds, _ in samples)
+    errors = sum(1 for _, ok in samples if not ok)
+    result = {
+        'requests': len(samples),
+        'errors': errors,
+        'error_rate': round(errors / len(samples), 4) if samples else 0,
+        'throughput_rps': round(len(samples) / duration, 2),
+    }
+    for pct in PERCENTILES:
+        value = percentile(latencies, pct)
+        result[f'p{pct}_ms'] = round(value, 1) if value is not None else None
+    return result
+
+
+class Client:
+    """One simulated browser: its own cookies, CSRF token and last chat id."""
+
+    def __init__(self, base_url, recorder, timeout):
+        self.base_url = base_url.rstrip('/')
+        self.recorder = recorder
+        self.timeout = timeout
+        self.cookies = CookieJar()
+        self.opener = build_opener(HTTPCookieProcessor(self.cookies), NoRedirect)
+        self.last_id = None
+
+    def csrf_token(self):
+        for cookie in self.cookies:
+            if cookie.name == settings.CSRF_COOKIE_NAME:
+                return cookie.value
+        return ''
+
+    def request(self, action, path, data=None, content_type=None, record=True):
+        headers = {'X-CSRFToken': self.csrf_token(), 'Referer': self.base_url + '/'}
+        if content_type:
+            headers['Content-Type'] = content_type
+        elif data is not None and not isinstance(data, bytes):
+            data = urlencode(data).encode()
+        start = time.perf_counter()
+        try:
+            with self.opener.open(Request(self.base_url + path, data=data, headers=headers), timeout=self.timeout) as response:
+                status, body = response.status, response.read()
+        except HTTPError as error:
+            status, body = error.code, error.read()
+        except (URLError, OSError):
+            status, body = None, b''
+        if record:
+            self.recorder.add(action, time.perf_counter() - start, status is not None and status < 400)
+        return status, body
+
+    def login(self, username, password):
+        self.request('login', '/login/', record=False)
+        status, _ = self.request('login', '/login/', {
+            'username': username, 'password': password, 'csrfmiddlewaretoken': self.csrf_token(),
+        }, record=False)
+        if status != 302:
+            raise CommandError(f"Could not log in as {username} (status {status})")
+
+    def poll_chat(self):
+        path = '/chat/get/' if self.last_id is None else f'/chat/get/?since={self.last_id}'
+        status, body = self.request('chat_poll', path)
+        if status == 200:
+            messages = json.loads(body)['messages']
+            if messages:
+                self.last_id = messages[-1]['id']
+
+    def stream_chat(self, deadline):
+        """Follow /chat/stream/ like EventSource does, until ``deadline``.
+
+        Each connection is one sample, timed to its response headers. Under
+        WSGI the server ends every stream right away, so this reconnects
+        every few seconds; under ASGI one connection lasts the whole run.
+        """
+        retry = 3.0
+        while time.monotonic() < deadline:
+            headers = {'Accept': 'text/event-stream'}
+            if self.last_id is not None:
+                headers['Last-Event-ID'] = str(self.last_id)
+            start = time.perf_counter()
+            try:
+                with self.opener.open(Request(self.base_url + '/chat/stream/', headers=headers), timeout=self.timeout) as response:
+                    self.recorder.add('chat_stream', time.perf_counter() - start, True)
+                    for line in response:
+                        if line.startswith(b'id: '):
+                            self.last_id = int(line[4:])
+                        elif line.startswith(b'retry: '):
+                            retry = int(line[7:]) / 1000
+                        if time.monotonic() >= deadline:
+                            return
+            except (URLError, OSError):
+                # Refused, an error status, or dropped mid-stream (no
+                # keepalive within the timeout)
+                self.recorder.add('chat_stream', time.perf_counter() - start, False)
+            time.sleep(retry)
+
+    def send_message(self):
+        self.request('chat_send', '/chat/send/', {'content': f"Mensaje de prueba {uuid.uuid4().hex[:8]}"})
+
+    def load_dashboard(self):
+        self.request('dashboard', '/')
+
+    def upload_photo(self, image):
+        boundary = uuid.uuid4().hex
+        body = b''.join([
+            f'--{boundary}\r\n'.encode(),
+            f'Content-Disposition: form-data; name="csrfmiddlewaretoken"\r\n\r\n{self.csrf_token()}\r\n'.encode(),
+            f'--{boundary}\r\n'.encode(),
+            b'Content-Disposition: form-data; name="image"; filename="foto.png"\r\n',
+            b'Content-Type: image/png\r\n\r\n',
+            image,
+            f'\r\n--{boundary}--\r\n'.encode(),
+        ])
+        self.request('photo_upload', '/gallery/upload/', body, f'multipart/form-data; boundary={boundary}')
+
+
+def random_png():
+    # A different image each time, so uploads aren't deduplicated away
+    buffer = BytesIO()
+    color = tuple(random.randrange(256) for _ in range(3))
+    Image.new('RGB', (800, 600), color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def run_every(interval, deadline, action):
+    # Start at a random offset so the simulated users don't move in lockstep
+    time.sleep(random.uniform(0, interval))
+    while time.monotonic() < deadline:
+        started = time.monotonic()
+        action()
+        time.sleep(max(interval - (time.monotonic() - started), 0))
+
+
+class Command(BaseCommand):
+    help = "Drive mixed chat/dashboard/upload traffic against the app and report latency percentiles as JSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help="Test an already running server (e.g. gunicorn) instead of starting one")
+        parser.add_argument('--username', help="Existing user to log in as with --url")
+        parser.add_argument('--password', help="Password for --username")
+        parser.add_argument('--tabs', type=int, default=20, help="Open chat tabs, each polling /chat/get/")
+        parser.add_argument('--poll-interval', type=float, default=3.0, help="Seconds between polls per tab")
+        parser.add_argument('--send-interval', type=float, default=30.0, help="Seconds between messages per tab")
+        parser.add_argument('--streams', type=int, default=10, help="Open chat tabs following /chat/stream/")
+        parser.add_argument('--dashboard-users', type=int, default=5, help="Users reloading the dashboard")
+        parser.add_argument('--dashboard-interval', type=float, default=10.0)
+        parser.add_argument('--uploaders', type=int, default=1, help="Users uploading photos")
+        parser.add_argument('--upload-interval', type=float, default=20.0)
+        parser.add_argument('--duration', type=float, default=60.0, help="Seconds of load")
+        parser.add_argument('--seed-messages', type=int, default=2000, help="Chat history to create first")
+        parser.add_argument('--timeout', type=float, default=30.0, help="Per-request timeout")
+        parser.add_argument('--output', help="Where to write the JSON report (default loadtest-<time>.json)")
+
+    def handle(self, *args, **options):
+        if options['url']:
+            if not (options['username'] and options['password']):
+                raise CommandError("--url needs --username and --password")
+            credentials = [(options['username'], options['password'])]
+            results = self.run_load(options['url'], credentials, options)
+        else:
+            results = self.run_local(options)
+
+        report = {
+            'started_at': results.pop('started_at'),
+            'commit': git_commit(),
+            'target': options['url'] or 'in-process',
+            'options': {key: options[key] for key in (
+                'tabs', 'poll_interval', 'send_interval', 'streams', 'dashboard_users', 'dashboard_interval',
+                'uploaders', 'upload_interval', 'duration', 'seed_messages',
+            )},
+            'results': results['summary'],
+        }
+        output = Path(options['output'] or f"loadtest-{datetime.now():%Y%m%d-%H%M%S}.json")
+        output.write_text(json.dumps(report, indent=2))
+        self.stdout.write(json.dumps(report['results'], indent=2))
+        self.stdout.write(f"Report written to {output}")
+
+    def run_local(self, options):
+        """Serve the app in-process against a throwaway database and media dir."""
+        workdir = Path(tempfile.mkdtemp(prefix='loadtest-'))
+        old_name = connection.settings_dict['NAME']
+        connection.settings_dict.setdefault('TEST', {})['NAME'] = str(workdir / 'db.sqlite3')
+        media = override_settings(MEDIA_ROOT=str(workdir / 'media'))
+        media.enable()
+        try:
+            self.stderr.write("Creating the load test database...")
+            connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            self.seed(options['seed_messages'])
+
+            httpd = ThreadedWSGIServer(('127.0.0.1', 0), QuietHandler)
+            httpd.set_app(get_internal_wsgi_application())
+            server = threading.Thread(target=httpd.serve_forever, daemon=True)
+            server.start()
+            try:
+                url = f'http://127.0.0.1:{httpd.server_port}'
+                return self.run_load(url, [(name, PASSWORD) for name in USERS], options)
+            finally:
+                httpd.shutdown()
+                httpd.server_close()
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            media.disable()
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    def seed(self, messages):
+        users = [User.objects.create_user(name, password=PASSWORD) for name in USERS]
+        Message.objects.bulk_create(
+            Message(user=users[i % 2], content=f"Mensaje {i}") for i in range(messages)
+        )
+        Note.objects.bulk_create(Note(user=users[i % 2], content=f"Nota {i}") for i in range(100))
+        WatchItem.objects.bulk_create(WatchItem(title=f"Peli {i}", added_by=users[0]) for i in range(100))
+
+    def run_load(self, url, credentials, options):
+        recorder = Recorder()
+        clients = []
+
+        def client():
+            c = Client(url, recorder, options['timeout'])
+            username, password = credentials[len(clients) % len(credentials)]
+            c.login(username, password)
+            clients.append(c)
+            return c
+
+        tabs = [client() for _ in range(options['tabs'])]
+        streams = [client() for _ in range(options['streams'])]
+        dashboards = [client() for _ in range(options['dashboard_users'])]
+        uploaders = [client() for _ in range(options['uploaders'])]
+
+        # (interval, action) for everything the simulated users keep doing
+        workers = []
+        for tab in tabs:
+            workers.append((options['poll_interval'], tab.poll_chat))
+            workers.append((options['send_interval'], tab.send_message))
+        for user in dashboards:
+            workers.append((options['dashboard_interval'], user.load_dashboard))
+        for user in uploaders:
+            workers.append((options['upload_interval'], lambda user=user: user.upload_photo(random_png())))
+
+        started_at = datetime.now().isoformat(timespec='seconds')
+        start = time.monotonic()
+        deadline = start + options['duration']
+        self.stderr.write(f"Running {len(workers) + len(streams)} simulated activities for {options['duration']:.0f}s against {url}...")
+        threads = [threading.Thread(target=run_every, args=(interval, deadline, action)) for interval, action in workers]
+        threads += [threading.Thread(target=stream.stream_chat, args=(deadline,)) for stream in streams]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - start
+        return {'started_at': started_at, 'summary': recorder.summary(elapsed)}
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, cwd=settings.BASE_DIR,
+        ).stdout.strip() or None
+    except OSError:
+        return None
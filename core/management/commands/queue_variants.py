@@ -0,0 +1,23 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db.models import ImageField
+
+from core.tasks import queue_variants
+from core.thumbnails import has_variants
+
+
+class Command(BaseCommand):
+    help = "Queue resized variants for stored images that don't have them yet (uploads from before variants)"
+
+    def handle(self, *args, **options):
+        queued = 0
+        for model in apps.get_models():
+            for field in model._meta.concrete_fields:
+                if not isinstance(field, ImageField):
+                    continue
+                for obj in model._default_manager.exclude(**{field.name: ''}).exclude(**{field.name: None}).iterator():
+                    field_file = getattr(obj, field.name)
+                    if not has_variants(field_file):
+                        queue_variants(field_file)
+                        queued += 1
+        self.stdout.write(f"Queued variants for {queued} image(s)")
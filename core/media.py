@@ -0,0 +1,179 @@
+"""Serving user uploads (MEDIA_ROOT) in production.
+
+Content-addressed names (``blobs/ab/<sha256>.jpg`` and their resized
+``variants/<size>/blobs/...``) never change, so they are sent with a strong
+ETag taken from the hash and a far-future immutable Cache-Control: browsers
+fetch each photo once. Other names get an ETag from size and mtime and a
+short max-age.
+
+Bodies are sent as FileResponse, which WSGI servers with sendfile support
+(gunicorn) hand to the kernel without copying through Python, including for
+Range requests. Behind nginx, set MEDIA_ACCEL_REDIRECT to an ``internal``
+location aliased to MEDIA_ROOT and the view only checks the request and
+sets headers, leaving the transfer itself to nginx.
+"""
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+from .uploadhandlers import INCOMING_DIR
+
+IMMUTABLE_NAME = re.compile(r'^(?:variants/(?P<variant>[^/]+)/)?blobs/[0-9a-f]{2}/(?P<digest>[0-9a-f]{64})\.\w+$')
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+MUTABLE_CACHE = 'public, max-age=3600'
+# Served instead of the file when present and accepted by the client
+PRECOMPRESSED = (('br', '.br'), ('gzip', '.gz'))
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class FileRange:
+    """Read-only view of ``length`` bytes of a file, starting at ``start``.
+
+    Keeps ``fileno`` so sendfile-capable servers can still use it; they
+    start at the file's current position and stop at Content-Length.
+    """
+
+    def __init__(self, file, start, length):
+        self.file = file
+        self.name = file.name
+        self.remaining = length
+        file.seek(start)
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """(start, end) of a single ``bytes=`` range, None to send everything.
+
+    Raises ValueError for a range that can't be satisfied.
+    """
+    match = RANGE.match(header or '')
+    if not match:
+        return None  # Absent, malformed or multiple ranges: send the whole file
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError(header)
+    return start, end
+
+
+def media_etag(path, stat, encoding=None):
+    match = IMMUTABLE_NAME.match(path)
+    if match:
+        # The name is the content hash (of the original, for variants)
+        tag = match['digest'] + (f'-{match["variant"]}' if match['variant'] else '')
+    else:
+        tag = f'{stat.st_mtime_ns:x}-{stat.st_size:x}'
+    # Each encoding is a different body, so it needs its own strong ETag
+    return f'"{tag}-{encoding}"' if encoding else f'"{tag}"'
+
+
+def not_modified(request, etag, mtime):
+    """Whether the client's copy is current, as Django's ``condition`` decides."""
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match is not None:
+        # Takes precedence over If-Modified-Since
+        return etag in parse_etags(if_none_match)
+    if_modified_since = parse_http_date_safe(request.headers.get('If-Modified-Since'))
+    return if_modified_since is not None and int(mtime) <= if_modified_since
+
+
+def accepted_encoding(request, full_path):
+    accept = request.headers.get('Accept-Encoding', '')
+    for encoding, suffix in PRECOMPRESSED:
+        if encoding in accept and os.path.isfile(full_path + suffix):
+            return encoding, full_path + suffix
+    return None, full_path
+
+
+@require_safe
+def serve(request, path):
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except ValueError:
+        raise Http404
+    # Checked on the normalized path, so ./ or blobs/../ can't get around it
+    if os.path.relpath(full_path, os.path.abspath(settings.MEDIA_ROOT)).split(os.sep)[0] == INCOMING_DIR:
+        raise Http404  # Uploads still in progress
+    try:
+        stat = os.stat(full_path)
+    except OSError:
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+
+    encoding, send_path = accepted_encoding(request, full_path)
+    etag = media_etag(path, stat, encoding)
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(stat.st_mtime),
+        'Cache-Control': IMMUTABLE_CACHE if IMMUTABLE_NAME.match(path) else MUTABLE_CACHE,
+        'Accept-Ranges': 'bytes',
+        'Vary': 'Accept-Encoding',
+    }
+    if not_modified(request, etag, stat.st_mtime):
+        response = HttpResponseNotModified()
+        for header, value in headers.items():
+            response[header] = value
+        return response
+
+    content_type, _ = mimetypes.guess_type(full_path)
+    size = os.path.getsize(send_path) if encoding else stat.st_size
+
+    byte_range = None
+    if not encoding and request.headers.get('If-Range', etag) == etag:
+        try:
+            byte_range = parse_range(request.headers.get('Range'), size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+    accel_prefix = getattr(settings, 'MEDIA_ACCEL_REDIRECT', None)
+    if accel_prefix or request.method == 'HEAD':
+        # nginx does the transfer (and ranges) itself; HEAD has no body
+        response = HttpResponse(content_type=content_type or 'application/octet-stream')
+        if accel_prefix:
+            response['X-Accel-Redirect'] = accel_prefix.rstrip('/') + '/' + os.path.relpath(send_path, settings.MEDIA_ROOT)
+        else:
+            response['Content-Length'] = size
+    else:
+        file = open(send_path, 'rb')
+        if byte_range:
+            start, end = byte_range
+            response = FileResponse(FileRange(file, start, end - start + 1), content_type=content_type)
+            response.status_code = 206
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response['Content-Length'] = end - start + 1
+        else:
+            response = FileResponse(file, content_type=content_type)
+
+    if encoding:
+        response['Content-Encoding'] = encoding
+    for header, value in headers.items():
+        response[header] = value
+    return response
@@ -0,0 +1,152 @@
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, deque
+from contextvars import ContextVar
+
+# Upper bounds (seconds) of the latency histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Quantiles are computed over the most recent requests of each view
+RECENT_SAMPLES = 1000
+QUANTILES = (0.5, 0.95, 0.99)
+PREFIX = 'shared_space'
+
+# Timings of the request being handled, if metrics are enabled
+current = ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    __slots__ = ('queries', 'db', 'template')
+
+    def __init__(self):
+        self.queries = 0
+        self.db = 0.0
+        self.template = 0.0
+
+    def sql_wrapper(self, execute, sql, params, many, context):
+        # connection.execute_wrapper hook
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db += time.perf_counter() - start
+            self.queries += 1
+
+    def server_timing(self, total):
+        return ', '.join([
+            f'db;dur={self.db * 1000:.1f};desc="{self.queries} queries"',
+            f'tpl;dur={self.template * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ])
+
+
+class ViewStats:
+    __slots__ = ('buckets', 'count', 'total', 'queries', 'db', 'template', 'statuses', 'recent')
+
+    def __init__(self):
+        self.buckets = [0] * len(BUCKETS)
+        self.count = 0
+        self.total = 0.0
+        self.queries = 0
+        self.db = 0.0
+        self.template = 0.0
+        self.statuses = Counter()
+        self.recent = deque(maxlen=RECENT_SAMPLES)
+
+
+class Registry:
+    """Per-view request metrics, rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def observe(self, view, status, duration, timings):
+        with self._lock:
+            stats = self._views.get(view)
+            if stats is None:
+                stats = self._views[view] = ViewStats()
+            index = bisect_left(BUCKETS, duration)
+            if index < len(BUCKETS):
+                stats.buckets[index] += 1
+            stats.count += 1
+            stats.total += duration
+            stats.queries += timings.queries
+            stats.db += timings.db
+            stats.template += timings.template
+            stats.statuses[status] += 1
+            stats.recent.append(duration)
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+    def render(self):
+        with self._lock:
+            views = sorted(self._views.items())
+            lines = []
+
+            def family(name, kind, help_text):
+                lines.append(f'# HELP {PREFIX}_{name} {help_text}')
+                lines.append(f'# TYPE {PREFIX}_{name} {kind}')
+
+            family('request_duration_seconds', 'histogram', 'Request latency by view.')
+            for view, stats in views:
+                cumulative = 0
+                for bound, count in zip(BUCKETS, stats.buckets):
+                    cumulative += count
+                    lines.append(f'{PREFIX}_request_duration_seconds_bucket{{view="{view}",le="{bound}"}} {cumulative}')
+                lines.append(f'{PREFIX}_request_duration_seconds_bucket{{view="{view}",le="+Inf"}} {stats.count}')
+                lines.append(f'{PREFIX}_request_duration_seconds_sum{{view="{view}"}} {stats.total:.6f}')
+                lines.append(f'{PREFIX}_request_duration_seconds_count{{view="{view}"}} {stats.count}')
+
+            family('request_latency_seconds', 'summary',
+                   f'Request latency quantiles over the last {RECENT_SAMPLES} requests of each view.')
+            for view, stats in views:
+                recent = sorted(stats.recent)
+                for q in QUANTILES:
+                    value = recent[min(int(q * len(recent)), len(recent) - 1)]
+                    lines.append(f'{PREFIX}_request_latency_seconds{{view="{view}",quantile="{q}"}} {value:.6f}')
+                lines.append(f'{PREFIX}_request_latency_seconds_sum{{view="{view}"}} {sum(recent):.6f}')
+                lines.append(f'{PREFIX}_request_latency_seconds_count{{view="{view}"}} {len(recent)}')
+
+            family('responses_total', 'counter', 'Responses by view and status code.')
+            for view, stats in views:
+                for status, count in sorted(stats.statuses.items()):
+                    lines.append(f'{PREFIX}_responses_total{{view="{view}",status="{status}"}} {count}')
+
+            counters = [
+                ('db_queries_total', 'SQL queries executed.', 'queries', '{}'),
+                ('db_seconds_total', 'Time spent in SQL queries.', 'db', '{:.6f}'),
+                ('template_seconds_total', 'Time spent rendering templates (including lazy queries).', 'template', '{:.6f}'),
+            ]
+            for name, help_text, attr, fmt in counters:
+                family(name, 'counter', help_text)
+                for view, stats in views:
+                    lines.append(f'{PREFIX}_{name}{{view="{view}"}} ' + fmt.format(getattr(stats, attr)))
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+def instrument_templates():
+    """Time every template render against the current request's timings."""
+    from django.template.backends.django import Template
+
+    if getattr(Template.render, 'timed', False):
+        return
+    original = Template.render
+
+    def render(self, context=None, request=None):
+        timings = current.get()
+        if timings is None:
+            return original(self, context, request)
+        start = time.perf_counter()
+        try:
+            return original(self, context, request)
+        finally:
+            timings.template += time.perf_counter() - start
+
+    render.timed = True
+    Template.render = render
@@ -0,0 +1,48 @@
+import time
+from functools import partial
+
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.db import connection
+from django.utils.functional import SimpleLazyObject
+
+from .auth import aget_user, get_user
+from .metrics import RequestTimings, current, instrument_templates, registry
+
+
+class MetricsMiddleware:
+    """Record latency, SQL and template time per URL name.
+
+    Only installed when METRICS_ENABLED is set (see settings), so there is no
+    cost at all otherwise. Adds a Server-Timing header to every response and
+    feeds the registry behind /metrics/.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        instrument_templates()
+
+    def __call__(self, request):
+        timings = RequestTimings()
+        token = current.set(timings)
+        start = time.perf_counter()
+        try:
+            with connection.execute_wrapper(timings.sql_wrapper):
+                response = self.get_response(request)
+        finally:
+            current.reset(token)
+        duration = time.perf_counter() - start
+
+        match = request.resolver_match
+        view = match.view_name if match else '<unmatched>'
+        registry.observe(view, response.status_code, duration, timings)
+        response['Server-Timing'] = timings.server_timing(duration)
+        return response
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    """AuthenticationMiddleware with ``request.user`` (and ``auser``) from the user cache."""
+
+    def process_request(self, request):
+        super().process_request(request)
+        request.user = SimpleLazyObject(lambda: get_user(request))
+        request.auser = partial(aget_user, request)
@@ -0,0 +1,78 @@
+# Generated by Django 6.0.2 on 2026-10-18 17:51
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+# Frozen copy of core.moods.ALIASES at the time of this migration
+ALIASES = {
+    'enojado': 'angry', 'angry': 'angry',
+    'triste': 'sad', 'sad': 'sad',
+    'cansado': 'tired', 'tired': 'tired',
+    'calmado': 'calm', 'tranqui': 'calm', 'calm': 'calm',
+    'feliz': 'happy', 'happy': 'happy',
+    'amoroso': 'love', 'love': 'love',
+}
+
+
+def backfill_mood_days(apps, schema_editor):
+    MoodEntry = apps.get_model('core', 'MoodEntry')
+    MoodDay = apps.get_model('core', 'MoodDay')
+    counts = {}
+    entries = MoodEntry.objects.values_list('user_id', 'mood', 'created_at')
+    for user_id, mood, created_at in entries.iterator():
+        key = ALIASES.get(mood)
+        if key:
+            bucket = (user_id, timezone.localdate(created_at), key)
+            counts[bucket] = counts.get(bucket, 0) + 1
+    MoodDay.objects.bulk_create(
+        MoodDay(user_id=user_id, day=day, mood=mood, count=count)
+        for (user_id, day, mood), count in counts.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_moodentry'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MoodDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('mood', models.CharField(max_length=20)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['day'],
+            },
+        ),
+        migrations.AlterField(
+            model_name='moodentry',
+            name='mood',
+            field=models.CharField(choices=[('enojado', 'Enojado'), ('triste', 'Triste'), ('cansado', 'Cansado'), ('tranqui', 'Tranqui'), ('feliz', 'Feliz'), ('amoroso', 'Amoroso'), ('angry', 'Angry'), ('sad', 'Sad'), ('tired', 'Tired'), ('calm', 'Calm'), ('happy', 'Happy'), ('love', 'Love')], max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='moodentry',
+            index=models.Index(fields=['user', '-created_at'], name='core_mood_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='moodentry',
+            index=models.Index(fields=['-created_at'], name='core_mood_created_idx'),
+        ),
+        migrations.AddField(
+            model_name='moodday',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mood_days', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterUniqueTogether(
+            name='moodday',
+            unique_together={('user', 'day', 'mood')},
+        ),
+        migrations.RunPython(backfill_mood_days, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 6.0.2 on 2026-10-18 18:41
+
+import time
+
+from django.db import migrations, models
+
+
+def create_versions(apps, schema_editor):
+    CacheVersion = apps.get_model('core', 'CacheVersion')
+    version = int(time.time() * 1000)
+    CacheVersion.objects.bulk_create(
+        CacheVersion(namespace=namespace, version=version)
+        for namespace in ['gallery', 'watchlist', 'notes', 'chat']
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_chunkedupload'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CacheVersion',
+            fields=[
+                ('namespace', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('version', models.BigIntegerField()),
+                ('modified', models.DateTimeField(null=True)),
+            ],
+        ),
+        migrations.RunPython(create_versions, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,10 @@
+import os
+import uuid
+
 from django.db import models
 from django.contrib.auth.models import User
+from .moods import get_mood, icon_html, DEFAULT_MOOD
+from .uploadhandlers import incoming_dir
 
 class DailyPhrase(models.Model):
     text = models.CharField(max_length=255)
@@ -58,38 +63,68 @@ class MoodEntry(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
 
     def get_emoji(self):
-        from django.utils.safestring import mark_safe
-        
-        # Consistent SVGs with main.js
-        svgs = {
-            'angry': """<svg viewBox="0 0 36 36" fill="url(#grad_angry)"><defs><linearGradient id="grad_angry" x1="0%" y1="0%" x2="100%" y2="100%"><stop offset="0%" style="stop-color:#FF5E62;stop-opacity:1" /><stop offset="100%" style="stop-color:#FF9966;stop-opacity:1" /></linearGradient></defs><circle cx="18" cy="18" r="18"/><path fill="#FFF" d="M11 23c0-2.5 7-2.5 14 0M10 14l5 2M26 14l-5 2" stroke="#FFF" stroke-width="2" stroke-linecap="round"/></svg>""",
-            
-            'sad': """<svg viewBox="0 0 36 36" fill="url(#grad_sad)"><defs><linearGradient id="grad_sad" x1="0%" y1="0%" x2="100%" y2="100%"><stop offset="0%" style="stop-color:#5B86E5;stop-opacity:1" /><stop offset="100%" style="stop-color:#36D1DC;stop-opacity:1" /></linearGradient></defs><circle cx="18" cy="18" r="18"/><circle fill="#FFF" cx="12" cy="14" r="2"/><circle fill="#FFF" cx="24" cy="14" r="2"/><path fill="none" stroke="#FFF" stroke-width="2" stroke-linecap="round" d="M12 25s3-2 6-2 6 2 6 2"/><path fill="#FFF" d="M25 15c.5 2 1 4 0 5" opacity="0.5"/></svg>""",
-            
-            'tired': """<svg viewBox="0 0 36 36" fill="url(#grad_tired)"><defs><linearGradient id="grad_tired" x1="0%" y1="0%" x2="100%" y2="100%"><stop offset="0%" style="stop-color:#bdc3c7;stop-opacity:1" /><stop offset="100%" style="stop-color:#2c3e50;stop-opacity:1" /></linearGradient></defs><circle cx="18" cy="18" r="18"/><path fill="none" stroke="#FFF" stroke-width="2" d="M10 16h6M20 16h6"/><circle fill="#FFF" cx="28" cy="12" r="3" opacity="0.5"/><circle fill="#FFF" cx="32" cy="8" r="1.5" opacity="0.5"/><path fill="none" stroke="#FFF" stroke-width="2" d="M14 24s2 2 4 2 4-2 4-2"/></svg>""",
-            
-            'calm': """<svg viewBox="0 0 36 36" fill="url(#grad_calm)"><defs><linearGradient id="grad_calm" x1="0%" y1="0%" x2="100%" y2="100%"><stop offset="0%" style="stop-color:#89f7fe;stop-opacity:1" /><stop offset="100%" style="stop-color:#66a6ff;stop-opacity:1" /></linearGradient></defs><circle cx="18" cy="18" r="18"/><circle fill="#FFF" cx="12" cy="15" r="2"/><circle fill="#FFF" cx="24" cy="15" r="2"/><path fill="none" stroke="#FFF" stroke-width="2" d="M13 22s2.5 2 5 2 5-2 5-2"/></svg>""",
-            
-            'happy': """<svg viewBox="0 0 36 36" fill="url(#grad_happy)"><defs><linearGradient id="grad_happy" x1="0%" y1="0%" x2="100%" y2="100%"><stop offset="0%" style="stop-color:#F2994A;stop-opacity:1" /><stop offset="100%" style="stop-color:#F2C94C;stop-opacity:1" /></linearGradient></defs><circle cx="18" cy="18" r="18"/><path fill="none" stroke="#FFF" stroke-width="2" stroke-linecap="round" d="M12 22s2.5 3 6 3 6-3 6-3"/><circle fill="#FFF" cx="12" cy="14" r="2"/><circle fill="#FFF" cx="24" cy="14" r="2"/></svg>""",
-            
-            'love': """<svg viewBox="0 0 36 36" fill="url(#grad_love)"><defs><linearGradient id="grad_love" x1="0%" y1="0%" x2="100%" y2="100%"><stop offset="0%" style="stop-color:#ff9a9e;stop-opacity:1" /><stop offset="100%" style="stop-color:#fecfef;stop-opacity:1" /></linearGradient></defs><circle cx="18" cy="18" r="18"/><path fill="#FFF" d="M18 25s-7-4-9-9c-2-5 3-8 6-5 1 1 3 4 3 4s2-3 3-4c3-3 8 0 6 5-2 5-9 9-9 9z"/></svg>"""
-        }
-        
-        # Map Spanish/Alt keys to the canonical English keys
-        key_map = {
-            'enojado': 'angry', 'angry': 'angry',
-            'triste': 'sad', 'sad': 'sad',
-            'cansado': 'tired', 'tired': 'tired',
-            'calmado': 'calm', 'tranqui': 'calm', 'calm': 'calm',
-            'feliz': 'happy', 'happy': 'happy',
-            'amoroso': 'love', 'love': 'love'
-        }
-        
-        canonical = key_map.get(self.mood, 'calm')
-        return mark_safe(svgs.get(canonical, svgs['calm']))
+        # Icon from the shared static SVG sprite, see core.moods
+        return icon_html(get_mood(self.mood) or DEFAULT_MOOD)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # "Latest mood" lookups for me / the other user
+            models.Index(fields=['user', '-created_at'], name='core_mood_user_created_idx'),
+            models.Index(fields=['-created_at'], name='core_mood_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.mood} at {self.created_at}"
+
+class MoodDay(models.Model):
+    # Daily rollup of MoodEntry per canonical mood, kept up to date by
+    # core.history.record_mood so charts never scan the raw entries.
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='mood_days')
+    day = models.DateField()
+    mood = models.CharField(max_length=20)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['day']
+        unique_together = ('user', 'day', 'mood')
+
+    def __str__(self):
+        return f"{self.user.username} - {self.mood} x{self.count} on {self.day}"
+
+class ChunkedUpload(models.Model):
+    # Resumable upload in progress, see core.uploads
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='chunked_uploads')
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.filename} ({self.size} bytes) by {self.user.username}"
+
+    @property
+    def path(self):
+        return os.path.join(incoming_dir(), f"{self.id}.part")
+
+    def received(self):
+        # The partial file on disk is the source of truth for the offset
+        try:
+            return os.path.getsize(self.path)
+        except FileNotFoundError:
+            return 0
+
+    def discard(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.delete()
+
+class CacheVersion(models.Model):
+    # Version counter of an app's cached pages, see core.cache. Kept here
+    # rather than in the cache so every process sees the same one.
+    namespace = models.CharField(max_length=50, primary_key=True)
+    version = models.BigIntegerField()
+    modified = models.DateTimeField(null=True)
+
+    def __str__(self):
+        return f"{self.namespace} v{self.version}"
@@ -0,0 +1,43 @@
+from collections import namedtuple
+
+from django.templatetags.static import static
+from django.utils.html import format_html
+
+# One entry per canonical mood. ``key`` is also the icon's id in the
+# static/moods.svg sprite (as "mood-<key>").
+Mood = namedtuple('Mood', ['key', 'label', 'gradient'])
+
+MOODS = {
+    'angry': Mood('angry', 'Enojado', "linear-gradient(135deg, #ffcdd2 0%, #ef9a9a 50%, #e57373 100%)"), # Soft Red
+    'sad': Mood('sad', 'Triste', "linear-gradient(135deg, #c5cae9 0%, #9fa8da 50%, #7986cb 100%)"), # Indigo/Lavenderish
+    'tired': Mood('tired', 'Cansado', "linear-gradient(135deg, #f5f5f5 0%, #e0e0e0 50%, #bdbdbd 100%)"), # Soft Gray
+    'calm': Mood('calm', 'Tranqui', "linear-gradient(135deg, #e3f2fd 0%, #bbdefb 50%, #90caf9 100%)"), # Sky Blue
+    'happy': Mood('happy', 'Feliz', "linear-gradient(135deg, #fff9c4 0%, #ffeb3b 50%, #fbc02d 100%)"), # Gold/Yellow
+    'love': Mood('love', 'Amoroso', "linear-gradient(135deg, #f8bbd0 0%, #f48fb1 50%, #f06292 100%)"), # Rose/Pink
+}
+
+# Spanish/alt keys stored in MoodEntry.mood -> canonical key
+ALIASES = {
+    'enojado': 'angry', 'angry': 'angry',
+    'triste': 'sad', 'sad': 'sad',
+    'cansado': 'tired', 'tired': 'tired',
+    'calmado': 'calm', 'tranqui': 'calm', 'calm': 'calm',
+    'feliz': 'happy', 'happy': 'happy',
+    'amoroso': 'love', 'love': 'love',
+}
+
+DEFAULT_MOOD = MOODS['calm']
+DEFAULT_GRADIENT = "linear-gradient(-45deg, #96a977, #81c784, #007F7A, #26a69a)"
+
+
+def get_mood(key):
+    """Canonical Mood for a stored key, or None if it isn't a known mood."""
+    canonical = ALIASES.get(key)
+    return MOODS[canonical] if canonical else None
+
+
+def icon_html(mood):
+    return format_html(
+        '<svg viewBox="0 0 36 36" class="mood-icon"><use href="{}#mood-{}"></use></svg>',
+        static('moods.svg'), mood.key,
+    )
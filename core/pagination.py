@@ -0,0 +1,33 @@
+import base64
+from datetime import datetime
+
+
+def encode_cursor(value, pk):
+    raw = f"{value.isoformat()}|{pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Inverse of encode_cursor; raises ValueError for malformed tokens."""
+    raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+    value, pk = raw.rsplit('|', 1)
+    return datetime.fromisoformat(value), int(pk)
+
+
+def keyset_page(queryset, field, cursor, limit):
+    """Newest-first page of ``queryset`` ordered by (field, id).
+
+    ``cursor`` is the opaque token returned for the previous page (or None for
+    the first one). Each page seeks straight to the cursor through an index on
+    (field, id), so deep pages cost the same as the first. Returns the rows and
+    the cursor for the next page (None on the last page).
+    """
+    queryset = queryset.order_by(f'-{field}', '-id')
+    if cursor:
+        value, pk = decode_cursor(cursor)
+        queryset = queryset.filter(**{f'{field}__lte': value}).exclude(**{field: value, 'id__gte': pk})
+    rows = list(queryset[:limit + 1])
+    if len(rows) <= limit:
+        return rows, None
+    last = rows[limit - 1]
+    return rows[:limit], encode_cursor(getattr(last, field), last.pk)
@@ -0,0 +1,74 @@
+import random
+
+from django.core.cache import cache
+from django.db.models.signals import post_save, post_delete
+from django.utils import timezone
+
+from .models import DailyPhrase, Announcement
+
+# Invalidation is signal driven (see connect_signals); the timeout is only a
+# safety net for changes made behind the ORM's back.
+CACHE_TIMEOUT = 60 * 60 * 6
+PERIODS = ('MORNING', 'AFTERNOON', 'EVENING')
+
+PHRASE_IDS_KEY = 'core:phrase-ids'
+ANNOUNCEMENT_IDS_KEY = 'core:announcement-ids:{period}'
+
+
+def current_period():
+    hour = timezone.now().hour
+    if 5 <= hour < 12:
+        return 'MORNING'
+    elif 12 <= hour < 20:
+        return 'AFTERNOON'
+    return 'EVENING'
+
+
+def _object_key(model, pk):
+    return f'core:{model._meta.model_name}:{pk}'
+
+
+def _random_cached(model, ids_key, queryset):
+    ids = cache.get(ids_key)
+    if ids is None:
+        # Warm the per-object entries too, they are tiny tables
+        objects = list(queryset)
+        ids = [obj.pk for obj in objects]
+        cache.set_many({_object_key(model, obj.pk): obj for obj in objects}, CACHE_TIMEOUT)
+        cache.set(ids_key, ids, CACHE_TIMEOUT)
+    if not ids:
+        return None
+
+    pk = random.choice(ids)
+    obj = cache.get(_object_key(model, pk))
+    if obj is None:
+        obj = model.objects.filter(pk=pk).first()
+        if obj is not None:
+            cache.set(_object_key(model, pk), obj, CACHE_TIMEOUT)
+    return obj
+
+
+def random_phrase():
+    return _random_cached(DailyPhrase, PHRASE_IDS_KEY, DailyPhrase.objects.filter(is_active=True))
+
+
+def random_announcement(period):
+    # Either ALL or current period
+    queryset = Announcement.objects.filter(is_active=True, time_of_day__in=['ALL', period])
+    return _random_cached(Announcement, ANNOUNCEMENT_IDS_KEY.format(period=period), queryset)
+
+
+def invalidate_phrases(sender, instance, **kwargs):
+    cache.delete_many([PHRASE_IDS_KEY, _object_key(DailyPhrase, instance.pk)])
+
+
+def invalidate_announcements(sender, instance, **kwargs):
+    keys = [ANNOUNCEMENT_IDS_KEY.format(period=period) for period in PERIODS]
+    cache.delete_many(keys + [_object_key(Announcement, instance.pk)])
+
+
+def connect_signals():
+    post_save.connect(invalidate_phrases, sender=DailyPhrase, dispatch_uid='core-phrases-save')
+    post_delete.connect(invalidate_phrases, sender=DailyPhrase, dispatch_uid='core-phrases-delete')
+    post_save.connect(invalidate_announcements, sender=Announcement, dispatch_uid='core-announcements-save')
+    post_delete.connect(invalidate_announcements, sender=Announcement, dispatch_uid='core-announcements-delete')
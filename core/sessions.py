@@ -0,0 +1,40 @@
+"""Session engine: ``cached_db`` with a short cache lifetime.
+
+Stock ``cached_db`` keeps a session in the cache for as long as the session
+lives. With a per-process cache (CACHE_BACKEND=locmem, single worker only)
+the job runner or a management command would then keep honouring a session
+for weeks after it was logged out, so here cache entries expire after
+SESSION_CACHE_TIMEOUT seconds and are reloaded from the database.
+"""
+from django.contrib.sessions.backends import cached_db
+
+SESSION_CACHE_TIMEOUT = 60
+
+
+class ShortLivedCache:
+    """Proxy for a cache that caps every timeout it is given."""
+
+    def __init__(self, cache, timeout):
+        self._cache = cache
+        self._timeout = timeout
+
+    def _cap(self, timeout):
+        return self._timeout if timeout is None else min(timeout, self._timeout)
+
+    def set(self, key, value, timeout=None):
+        return self._cache.set(key, value, self._cap(timeout))
+
+    async def aset(self, key, value, timeout=None):
+        return await self._cache.aset(key, value, self._cap(timeout))
+
+    def __contains__(self, key):
+        return key in self._cache
+
+    def __getattr__(self, name):
+        return getattr(self._cache, name)
+
+
+class SessionStore(cached_db.SessionStore):
+    def __init__(self, session_key=None):
+        super().__init__(session_key)
+        self._cache = ShortLivedCache(self._cache, SESSION_CACHE_TIMEOUT)
@@ -0,0 +1,64 @@
+import hashlib
+import os
+import posixpath
+
+from django.apps import apps
+from django.core.files.storage import FileSystemStorage
+from django.db.models import FileField
+from django.utils.deconstruct import deconstructible
+
+BLOB_DIR = 'blobs'
+
+
+def content_digest(content):
+    """SHA-256 of a Django File, read chunk by chunk."""
+    sha = hashlib.sha256()
+    for chunk in content.chunks():
+        sha.update(chunk)
+    content.seek(0)
+    return sha.hexdigest()
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Stores every distinct upload once, named after the hash of its content.
+
+    The directory coming from ``upload_to`` is ignored, so the same photo sent
+    in the chat and uploaded to the gallery ends up as a single
+    ``blobs/ab/abcd...ef.jpg`` file. Names never change once written, which is
+    what lets media be served with immutable cache headers. Several rows can
+    point to one blob, so blobs are only deleted by ``core.tasks.collect_blob``.
+    """
+
+    def _save(self, name, content):
+        digest = getattr(content, 'sha256', None) or content_digest(content)
+        ext = posixpath.splitext(name)[1].lower()
+        blob_name = f"{BLOB_DIR}/{digest[:2]}/{digest}{ext}"
+        if self.exists(blob_name):
+            # Marks the blob as in use again for collect_blob, before the
+            # row pointing at it is saved
+            os.utime(self.path(blob_name))
+            return blob_name
+        return super()._save(blob_name, content)
+
+
+blob_storage = ContentAddressedStorage()
+
+
+def blob_fields(model):
+    """The file fields of ``model`` stored as content-addressed blobs."""
+    return [field for field in model._meta.concrete_fields
+            if isinstance(field, FileField) and isinstance(field.storage, ContentAddressedStorage)]
+
+
+def is_referenced(name):
+    """Whether any row still points at the stored file ``name``."""
+    for model in apps.get_models():
+        for field in blob_fields(model):
+            if model._default_manager.filter(**{field.name: name}).exists():
+                return True
+        # Models keeping blob names outside a FileField (the chat archive)
+        references_blob = getattr(model, 'references_blob', None)
+        if references_blob and references_blob(name):
+            return True
+    return False
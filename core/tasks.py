@@ -0,0 +1,74 @@
+import os
+import time
+
+from django.apps import apps
+from django.db.models.signals import post_delete
+
+from jobs.queue import task, enqueue, jobs_for
+from .cache import bump_version_for
+from .storage import blob_fields, blob_storage, is_referenced
+from .thumbnails import delete_variants, generate_variants, has_variants
+
+# A blob saved again within this long (a re-upload whose row may not be
+# committed yet) is left alone; deleting that row queues a new check
+BLOB_GRACE_SECONDS = 300
+
+
+@task
+def generate_image_variants(model, pk, field):
+    obj = apps.get_model(model).objects.filter(pk=pk).first()
+    if obj is None:
+        return  # Deleted before the worker got to it
+    field_file = getattr(obj, field)
+    if field_file:
+        generate_variants(field_file)
+        # Cached pages still point at the original image
+        bump_version_for(model)
+
+
+def queue_variants(field_file):
+    """Queue the resized copies of a newly saved ImageField file."""
+    if has_variants(field_file):
+        return  # The same content was uploaded before
+    payload = {
+        'model': field_file.instance._meta.label,
+        'pk': field_file.instance.pk,
+        'field': field_file.field.name,
+    }
+    # Already waiting, or given up on (an unreadable image fails every
+    # attempt): queueing it again would only repeat that
+    if jobs_for(generate_image_variants, **payload).filter(status__in=['PENDING', 'RUNNING', 'FAILED']).exists():
+        return
+    enqueue(generate_image_variants, **payload)
+
+
+@task
+def collect_blob(name):
+    """Delete a stored blob and its variants once no row points at it."""
+    if is_referenced(name) or not blob_storage.exists(name):
+        return
+    if os.path.getmtime(blob_storage.path(name)) > time.time() - BLOB_GRACE_SECONDS:
+        return
+    delete_variants(name)
+    blob_storage.delete(name)
+
+
+def queue_blob_collection(name):
+    enqueue(collect_blob, delay=BLOB_GRACE_SECONDS, name=name)
+
+
+def collect_deleted_blobs(sender, instance, **kwargs):
+    # The blob may be shared with other rows, so the worker deletes it later
+    # if nothing points at it by then
+    for field in blob_fields(sender):
+        field_file = getattr(instance, field.attname)
+        if field_file:
+            queue_blob_collection(field_file.name)
+
+
+def connect_signals():
+    # post_delete also covers queryset deletes, cascades and admin actions
+    for model in apps.get_models():
+        if blob_fields(model):
+            post_delete.connect(collect_deleted_blobs, sender=model,
+                                dispatch_uid=f'blob-delete-{model._meta.label}')
@@ -0,0 +1,10 @@
+from django import template
+
+from core import thumbnails
+
+register = template.Library()
+
+
+@register.filter
+def variants(field_file):
+    return thumbnails.variant_urls(field_file)
@@ -0,0 +1,98 @@
+import json
+import shutil
+import tempfile
+import time
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+
+from .auth import cache_user
+from .thumbnails import VARIANTS, variant_name, widths_name
+
+# Seed sizes for the query budget tests: well past the page sizes, so a
+# per-row query shows up as a budget overrun rather than going unnoticed
+SEED_PHOTOS = 300
+SEED_NOTES = 300
+SEED_WATCH_ITEMS = 200
+SEED_REVIEWS_PER_ITEM = 2
+SEED_MESSAGES = 3000
+SEED_MOODS = 500
+
+# Every photo in the seed shares one blob, like re-uploads of the same file
+SEED_IMAGE = 'blobs/ab/abcdef.jpg'
+
+
+class SpaceFixtureMixin:
+    """Two users, a temporary MEDIA_ROOT and a private cache for a test case.
+
+    ``user`` is logged in with its session and user already cached, as on
+    every request of a logged-in user after the first. Subclasses add their
+    rows in ``seed()``. Mix in before ``TestCase``.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls._media_root = tempfile.mkdtemp()
+        # A private cache, so cache.clear() doesn't wipe the shared one
+        cls._media_override = override_settings(MEDIA_ROOT=cls._media_root, CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests'},
+        })
+        cls._media_override.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls._media_override.disable()
+        shutil.rmtree(cls._media_root, ignore_errors=True)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('pacu', password='secret', is_staff=True)
+        cls.other = User.objects.create_user('taii', password='secret')
+        cls.seed()
+
+    @classmethod
+    def seed(cls):
+        pass
+
+    @staticmethod
+    def seed_image_variants(name=SEED_IMAGE):
+        # Ready-made variants, so rendering doesn't queue resize jobs
+        for variant in VARIANTS:
+            default_storage.save(variant_name(name, variant), ContentFile(b'RIFF'))
+        default_storage.save(widths_name(name), ContentFile(json.dumps(VARIANTS)))
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.client.force_login(self.user)
+        cache_user(self.user)
+
+
+class QueryBudgetTestCase(SpaceFixtureMixin, TestCase):
+    """Base class for the per-view query budget tests.
+
+    Each app seeds large tables in ``seed()`` and then asserts an exact query
+    count for every URL with ``assertBudget``. Budgets are counted with cold
+    page caches but the session and user already cached, and must stay the
+    same no matter how many rows the tables hold. Pages of the cached apps
+    include one query for their cache version (core/cache.py), even when
+    served from the cache.
+    """
+
+    # Wall-clock ceiling per request, generous enough for slow CI machines
+    latency_ceiling = 1.0
+
+    def assertBudget(self, queries, url, method='get', data=None, status=200, **extra):
+        client_method = getattr(self.client, method)
+        start = time.perf_counter()
+        with self.assertNumQueries(queries):
+            response = client_method(url, data or {}, **extra)
+        elapsed = time.perf_counter() - start
+        self.assertEqual(response.status_code, status)
+        self.assertLess(elapsed, self.latency_ceiling, f"{method.upper()} {url} took {elapsed:.3f}s")
+        return response
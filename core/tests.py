@@ -1,3 +1,449 @@
-from django.test import TestCase
+import gzip
+import os
+import zipfile
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.models import F
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from jobs.models import Job
+
+from .backup import snapshot
+from .cache import bump_version, get_version, versioned_key
+from .metrics import Registry, RequestTimings, registry
+from .models import Announcement, CacheVersion, ChunkedUpload, DailyPhrase, MoodDay, MoodEntry
+from .moods import MOODS
+from .testing import QueryBudgetTestCase, SpaceFixtureMixin, SEED_IMAGE, SEED_MOODS
+from .thumbnails import generate_variants, variant_urls
+from .uploadhandlers import UPLOAD_ERRORS
+from .uploads import start_upload
+
+
+def png_bytes():
+    buffer = BytesIO()
+    Image.new('RGB', (64, 48), 'teal').save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class CoreQueryBudgetTests(QueryBudgetTestCase):
+    @classmethod
+    def seed(cls):
+        DailyPhrase.objects.bulk_create(DailyPhrase(text=f"Frase {i}") for i in range(50))
+        Announcement.objects.bulk_create(
+            Announcement(title=f"Aviso {i}", content="...", time_of_day=period)
+            for i, period in enumerate(['ALL', 'MORNING', 'AFTERNOON', 'EVENING'] * 10)
+        )
+        keys = list(MOODS)
+        MoodEntry.objects.bulk_create(
+            MoodEntry(user=cls.user if i % 2 else cls.other, mood=keys[i % len(keys)])
+            for i in range(SEED_MOODS)
+        )
+        # A year of daily rollups for both users
+        today = timezone.localdate()
+        MoodDay.objects.bulk_create(
+            MoodDay(user=user, day=today - timedelta(days=n), mood=keys[n % len(keys)], count=2)
+            for user in (cls.user, cls.other)
+            for n in range(365)
+        )
+        cls.announcement = Announcement.objects.first()
+
+    def test_home(self):
+        # Phrase and announcement id lists, then both latest moods
+        self.assertBudget(4, reverse('home'))
+
+    def test_home_cached(self):
+        self.client.get(reverse('home'))
+        self.assertBudget(2, reverse('home'))
+
+    def test_login_page(self):
+        self.client = Client()
+        self.assertBudget(0, reverse('login'))
+
+    def test_login(self):
+        self.client = Client()
+        self.assertBudget(9, reverse('login'), 'post', {'username': 'taii', 'password': 'secret'}, status=302)
+
+    def test_logout(self):
+        self.assertBudget(2, reverse('logout'), status=302)
+
+    def test_create_mood(self):
+        # Entry plus the rollup row, inside one transaction
+        self.assertBudget(7, reverse('create_mood'), 'post', {'mood': 'happy'}, status=302)
+
+    def test_mood_history(self):
+        for period in ('day', 'week', 'month'):
+            with self.subTest(period=period):
+                # Partner lookup, then streaks and distribution per user
+                self.assertBudget(5, reverse('mood_history'), data={'period': period})
+
+    def test_mood_history_data(self):
+        for period in ('day', 'week', 'month'):
+            with self.subTest(period=period):
+                self.assertBudget(5, reverse('mood_history_data'), data={'period': period})
+
+    def test_manage_announcements(self):
+        self.assertBudget(1, reverse('manage_announcements'))
+
+    def test_add_announcement(self):
+        data = {'title': 'Hola', 'content': 'Buen día', 'time_of_day': 'MORNING'}
+        self.assertBudget(1, reverse('add_announcement'), 'post', data, status=302)
+
+    def test_delete_announcement(self):
+        self.assertBudget(2, reverse('delete_announcement', args=[self.announcement.id]), 'post', status=302)
+
+    def test_cached_user_dropped_on_password_change(self):
+        self.user.set_password('otra')
+        self.user.save()
+        self.assertEqual(self.client.get(reverse('home')).status_code, 302)
+
+    def test_metrics_disabled(self):
+        self.assertBudget(0, reverse('metrics'), status=404)
+
+    def test_media(self):
+        blob = os.path.join(settings.MEDIA_ROOT, SEED_IMAGE)
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        with open(blob, 'wb') as f:
+            f.write(b'\xff\xd8\xff')
+        self.assertBudget(0, settings.MEDIA_URL + SEED_IMAGE)
+
+    def test_export(self):
+        # Rows are only read while the zip streams
+        self.assertBudget(0, reverse('export_space'))
+
+    def test_upload_start(self):
+        # Includes purging stale uploads
+        self.assertBudget(2, reverse('upload_start'), 'post', {'filename': 'foto.png', 'size': 100})
+
+    def test_upload_offset(self):
+        upload = start_upload(self.user, 'foto.png', 100)
+        self.assertBudget(1, reverse('upload_chunk', args=[upload.id]))
+
+    def test_upload_chunk(self):
+        upload = start_upload(self.user, 'foto.png', 100)
+        self.assertBudget(1, reverse('upload_chunk', args=[upload.id]) + '?offset=0', 'post',
+                          png_bytes()[:50], content_type='application/octet-stream')
+
+
+@override_settings(METRICS_ENABLED=True, MIDDLEWARE=['core.middleware.MetricsMiddleware', *settings.MIDDLEWARE])
+class MetricsTests(SpaceFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        registry.reset()
+
+    def test_server_timing(self):
+        response = self.client.get(reverse('home'))
+        timings = dict(part.split(';', 1) for part in response['Server-Timing'].split(', '))
+        self.assertEqual(list(timings), ['db', 'tpl', 'total'])
+        self.assertRegex(timings['db'], r'^dur=\d+\.\d;desc="[1-9]\d* queries"$')
+        self.assertRegex(timings['tpl'], r'^dur=\d+\.\d$')
+        self.assertNotEqual(timings['tpl'], 'dur=0.0')
+
+    def test_per_view_counters(self):
+        self.client.get(reverse('home'))
+        self.client.get(reverse('home'))
+        self.client.get(reverse('mood_history_data'))
+        text = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('shared_space_responses_total{view="home",status="200"} 2\n', text)
+        self.assertIn('shared_space_request_duration_seconds_count{view="home"} 2\n', text)
+        self.assertIn('shared_space_request_duration_seconds_bucket{view="home",le="+Inf"} 2\n', text)
+        self.assertIn('shared_space_responses_total{view="mood_history_data",status="200"} 1\n', text)
+        self.assertRegex(text, r'shared_space_db_queries_total\{view="home"\} [1-9]')
+        # The page being rendered isn't counted yet
+        self.assertNotIn('view="metrics"', text)
+
+    def test_render(self):
+        registry = Registry()
+        timings = RequestTimings()
+        timings.queries, timings.db, timings.template = 3, 0.002, 0.004
+        for duration in (0.003, 0.02, 0.02, 0.3):
+            registry.observe('home', 200, duration, timings)
+        registry.observe('home', 404, 20.0, timings)
+        lines = registry.render().splitlines()
+        for line in [
+            '# TYPE shared_space_request_duration_seconds histogram',
+            'shared_space_request_duration_seconds_bucket{view="home",le="0.005"} 1',
+            'shared_space_request_duration_seconds_bucket{view="home",le="0.025"} 3',
+            'shared_space_request_duration_seconds_bucket{view="home",le="10.0"} 4',
+            'shared_space_request_duration_seconds_bucket{view="home",le="+Inf"} 5',
+            'shared_space_request_duration_seconds_sum{view="home"} 20.343000',
+            '# TYPE shared_space_request_latency_seconds summary',
+            'shared_space_request_latency_seconds{view="home",quantile="0.5"} 0.020000',
+            'shared_space_request_latency_seconds{view="home",quantile="0.99"} 20.000000',
+            'shared_space_responses_total{view="home",status="200"} 4',
+            'shared_space_responses_total{view="home",status="404"} 1',
+            'shared_space_db_queries_total{view="home"} 15',
+            'shared_space_template_seconds_total{view="home"} 0.020000',
+        ]:
+            self.assertIn(line, lines)
+
+
+class CacheVersionTests(SpaceFixtureMixin, TestCase):
+    def test_shared_between_processes(self):
+        key = versioned_key('gallery', 'page')
+        bump_version('gallery')
+        # Another process has its own cache but the same counter
+        cache.clear()
+        self.assertNotEqual(versioned_key('gallery', 'page'), key)
+
+    def test_bumps_add_up(self):
+        version = get_version('notes')
+        bump_version('notes')
+        bump_version('notes')
+        self.assertEqual(get_version('notes'), version + 2)
+
+    def test_etag_follows_other_processes(self):
+        etag = self.client.get(reverse('gallery_index'))['ETag']
+        self.assertEqual(self.client.get(reverse('gallery_index'), HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # A photo changed by another process, whose cache this one never sees
+        CacheVersion.objects.filter(namespace='gallery').update(version=F('version') + 1)
+        response = self.client.get(reverse('gallery_index'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_new_namespace(self):
+        bump_version('other')
+        self.assertGreater(CacheVersion.objects.get(namespace='other').version, 1)
+        self.assertIsNotNone(CacheVersion.objects.get(namespace='other').modified)
+
+
+class MediaTests(SpaceFixtureMixin, TestCase):
+    blob = 'blobs/ab/' + 'ab' * 32 + '.jpg'
+
+    def setUp(self):
+        super().setUp()
+        os.makedirs(os.path.join(settings.MEDIA_ROOT, 'blobs/ab'), exist_ok=True)
+        with open(os.path.join(settings.MEDIA_ROOT, self.blob), 'wb') as f:
+            f.write(b'0123456789')
+
+    def get(self, path, status=200, **extra):
+        response = self.client.get(settings.MEDIA_URL + path, **extra)
+        self.assertEqual(response.status_code, status)
+        return response
+
+    def test_immutable_blob(self):
+        response = self.get(self.blob)
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+        self.get(self.blob, HTTP_IF_NONE_MATCH=response['ETag'], status=304)
+
+    def test_range(self):
+        response = self.get(self.blob, HTTP_RANGE='bytes=2-4', status=206)
+        self.assertEqual(response['Content-Range'], 'bytes 2-4/10')
+        self.assertEqual(b''.join(response.streaming_content), b'234')
+        self.get(self.blob, HTTP_RANGE='bytes=10-', status=416)
+
+    def test_etag_per_encoding(self):
+        with open(os.path.join(settings.MEDIA_ROOT, self.blob + '.gz'), 'wb') as f:
+            f.write(gzip.compress(b'0123456789'))
+        plain = self.get(self.blob)
+        packed = self.get(self.blob, HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(packed['Content-Encoding'], 'gzip')
+        self.assertEqual(packed['ETag'], plain['ETag'][:-1] + '-gzip"')
+        self.assertEqual(packed['Vary'], 'Accept-Encoding')
+        # A cached gzip body doesn't answer a request that can't take it
+        self.get(self.blob, HTTP_IF_NONE_MATCH=packed['ETag'])
+        self.get(self.blob, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=packed['ETag'], status=304)
+
+    def test_if_modified_since(self):
+        last_modified = self.get(self.blob)['Last-Modified']
+        self.get(self.blob, HTTP_IF_MODIFIED_SINCE=last_modified, status=304)
+        self.get(self.blob, HTTP_IF_MODIFIED_SINCE='Mon, 01 Jan 2001 00:00:00 GMT')
+        # If-None-Match wins when both are sent
+        self.get(self.blob, HTTP_IF_MODIFIED_SINCE=last_modified, HTTP_IF_NONE_MATCH='"other"')
+
+    def test_incoming_hidden(self):
+        os.makedirs(os.path.join(settings.MEDIA_ROOT, '.incoming'), exist_ok=True)
+        open(os.path.join(settings.MEDIA_ROOT, '.incoming', 'x.jpg'), 'wb').close()
+        for path in ['.incoming/x.jpg', './.incoming/x.jpg', 'blobs/../.incoming/x.jpg', 'blobs//../.incoming/x.jpg']:
+            self.get(path, status=404)
+
+
+class ResumableUploadTests(SpaceFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.data = png_bytes()
+        self.upload_id = self.client.post(reverse('upload_start'), {
+            'filename': 'foto.png', 'size': len(self.data),
+        }).json()['id']
+        self.url = reverse('upload_chunk', args=[self.upload_id])
+
+    def send(self, offset, data, client=None):
+        return (client or self.client).post(f'{self.url}?offset={offset}', data,
+                                            content_type='application/octet-stream')
+
+    def send_all(self):
+        half = len(self.data) // 2
+        self.send(0, self.data[:half])
+        self.assertTrue(self.send(half, self.data[half:]).json()['complete'])
+
+    def test_offset_mismatch(self):
+        response = self.send(10, self.data[10:20])
+        self.assertEqual((response.status_code, response.json()['offset']), (409, 0))
+
+    def test_resume(self):
+        half = len(self.data) // 2
+        self.assertEqual(self.send(0, self.data[:half]).json(), {'offset': half, 'complete': False})
+        # The response was lost: the retry of the same chunk is refused with
+        # the real offset, which is also what a GET reports
+        response = self.send(0, self.data[:half])
+        self.assertEqual((response.status_code, response.json()['offset']), (409, half))
+        self.assertEqual(self.client.get(self.url).json(), {'offset': half, 'size': len(self.data)})
+        self.assertEqual(self.send(half, self.data[half:]).json(), {'offset': len(self.data), 'complete': True})
+
+    def test_other_user(self):
+        other = Client()
+        other.force_login(self.other)
+        self.assertEqual(other.get(self.url).status_code, 404)
+        self.assertEqual(self.send(0, self.data, client=other).status_code, 404)
+        self.assertEqual(ChunkedUpload.objects.get().received(), 0)
+
+    def test_claimed_by_gallery(self):
+        from gallery.models import Photo
+
+        self.send_all()
+        path = ChunkedUpload.objects.get().path
+        self.client.post(reverse('upload_photo'), {'upload_id': self.upload_id})
+        photo = Photo.objects.get()
+        with photo.image.open('rb') as f:
+            self.assertEqual(f.read(), self.data)
+        self.assertFalse(ChunkedUpload.objects.exists())
+        self.assertFalse(os.path.exists(path))
+
+    def test_claimed_once(self):
+        from gallery.models import Photo
+
+        self.send_all()
+        self.client.post(reverse('upload_photo'), {'upload_id': self.upload_id})
+        self.client.post(reverse('upload_photo'), {'upload_id': self.upload_id})
+        self.assertEqual(Photo.objects.count(), 1)
+
+    def test_unfinished_not_claimed(self):
+        from gallery.models import Photo
+
+        self.send(0, self.data[:10])
+        self.client.post(reverse('upload_photo'), {'upload_id': self.upload_id})
+        self.assertFalse(Photo.objects.exists())
+        self.assertTrue(ChunkedUpload.objects.exists())
+
+    def test_not_an_image_discarded(self):
+        path = ChunkedUpload.objects.get().path
+        response = self.send(0, b'esto no es una imagen')
+        self.assertEqual((response.status_code, response.json()['error']), (400, UPLOAD_ERRORS['not_an_image']))
+        self.assertFalse(ChunkedUpload.objects.exists())
+        self.assertFalse(os.path.exists(path))
+
+
+class VariantTests(SpaceFixtureMixin, TestCase):
+    def setUp(self):
+        from gallery.models import Photo
+
+        super().setUp()
+        buffer = BytesIO()
+        Image.new('RGB', (400, 300), 'teal').save(buffer, 'PNG')
+        self.photo = Photo.objects.create(image=SimpleUploadedFile('foto.png', buffer.getvalue()),
+                                          uploader=self.user)
+
+    def test_lookup_only(self):
+        # Rendering a page never queues or writes anything
+        with self.assertNumQueries(0):
+            urls = variant_urls(self.photo.image)
+        self.assertEqual(urls['thumb'], self.photo.image.url)
+        self.assertEqual(urls['srcset'], '')
+        self.assertFalse(Job.objects.exists())
+
+    def test_real_widths(self):
+        generate_variants(self.photo.image)
+        urls = variant_urls(self.photo.image)
+        # Smaller than the medium and full sizes, so those are the same width
+        self.assertEqual(urls['srcset'], f"{urls['thumb']} 320w, {urls['medium']} 400w")
+
+
+class BackupTests(SpaceFixtureMixin, TestCase):
+    @classmethod
+    def seed(cls):
+        from chat.models import Message
+        from gallery.models import Photo
+        from notes.models import Note
+        from watchlist.models import Review, WatchItem
+
+        DailyPhrase.objects.create(text="Frase")
+        MoodEntry.objects.create(user=cls.user, mood='happy')
+        Note.objects.create(user=cls.other, content="Nota 😀")
+        item = WatchItem.objects.create(title="Peli", added_by=cls.user)
+        Review.objects.create(watch_item=item, user=cls.other, rating=5)
+        Photo.objects.create(uploader=cls.user, image=SEED_IMAGE)
+        Message.objects.create(user=cls.user, content="Hola")
+        cls.note_created = Note.objects.get().created_at
+
+    def setUp(self):
+        super().setUp()
+        os.makedirs(os.path.join(settings.MEDIA_ROOT, os.path.dirname(SEED_IMAGE)), exist_ok=True)
+        with open(os.path.join(settings.MEDIA_ROOT, SEED_IMAGE), 'wb') as f:
+            f.write(b'\xff\xd8\xff')
+
+    def export(self):
+        path = os.path.join(settings.MEDIA_ROOT, 'export.zip')
+        call_command('export_space', '--output', path, stdout=StringIO())
+        return path
+
+    def test_export_endpoint(self):
+        response = self.client.get(reverse('export_space'))
+        with zipfile.ZipFile(BytesIO(b''.join(response.streaming_content))) as archive:
+            self.assertIn('data/notes.Note.jsonl', archive.namelist())
+            self.assertIn(f'media/{SEED_IMAGE}', archive.namelist())
+
+    def test_round_trip(self):
+        from notes.models import Note
+        from watchlist.models import Review
+
+        path = self.export()
+        User.objects.create_user('nueva')
+        # Search index, mood rollups and caches are rebuilt after commit
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('import_space', path, '--user', 'taii=nueva', stdout=StringIO())
+        note = Note.objects.get(user__username='nueva')
+        self.assertEqual((note.content, note.created_at), ("Nota 😀", self.note_created))
+        review = Review.objects.get(user__username='nueva')
+        self.assertNotEqual(review.watch_item_id, Review.objects.get(user=self.other).watch_item_id)
+        self.assertEqual(MoodDay.objects.get(user=self.user).count, 2)
+
+    def test_import_missing_reference(self):
+        # A review whose watchlist item didn't make it into the zip
+        path = self.export()
+        broken = os.path.join(settings.MEDIA_ROOT, 'broken.zip')
+        with zipfile.ZipFile(path) as src, zipfile.ZipFile(broken, 'w') as dst:
+            for info in src.infolist():
+                data = b'' if info.filename == 'data/watchlist.WatchItem.jsonl' else src.read(info)
+                dst.writestr(info, data)
+        with self.assertRaisesMessage(CommandError, "watchlist.Review"):
+            call_command('import_space', broken, stdout=StringIO())
+
+    def test_import_unknown_user(self):
+        path = self.export()
+        User.objects.filter(username='taii').update(username='otra')
+        with self.assertRaisesMessage(CommandError, "Unknown users: taii"):
+            call_command('import_space', path, stdout=StringIO())
+
+
+@skipUnless(connection.vendor == 'sqlite', "SQLite's deferred snapshot")
+class SnapshotTests(TransactionTestCase):
+    def test_snapshot(self):
+        # Outside any atomic block (as in a streamed export), one deferred
+        # transaction spans every read and is rolled back afterwards
+        with snapshot():
+            User.objects.count()
+            self.assertTrue(connection.connection.in_transaction)
+            self.assertFalse(connection.in_atomic_block)
+        self.assertFalse(connection.connection.in_transaction)
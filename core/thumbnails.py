@@ -0,0 +1,105 @@
+import json
+import posixpath
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+# Longest edge in pixels for each resized copy of an uploaded image
+VARIANTS = {
+    'thumb': 320,
+    'medium': 960,
+    'full': 1920,
+}
+# Variants have fixed names derived from the original's, so they are written
+# through the plain media storage rather than the original's (possibly
+# content-addressed) storage.
+VARIANT_DIR = 'variants'
+VARIANT_FORMAT = 'WEBP'
+VARIANT_QUALITY = 80
+
+
+def variant_name(name, variant):
+    root, _ = posixpath.splitext(name)
+    return f"{VARIANT_DIR}/{variant}/{root}.webp"
+
+
+def widths_name(name):
+    # Real width of each variant: smaller originals aren't scaled up
+    root, _ = posixpath.splitext(name)
+    return f"{VARIANT_DIR}/widths/{root}.json"
+
+
+def variant_widths(name):
+    """{variant: width in pixels}, or None until the whole set is written."""
+    try:
+        with default_storage.open(widths_name(name)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def has_variants(field_file):
+    # The widths file is written last, so it only exists once the whole set does
+    return default_storage.exists(widths_name(field_file.name))
+
+
+def generate_variants(field_file):
+    """Write the resized copies of an ImageField file next to the original."""
+    if has_variants(field_file):
+        return
+
+    widths = {}
+    field_file.open('rb')
+    try:
+        with Image.open(field_file) as original:
+            image = ImageOps.exif_transpose(original)
+            if image.mode not in ('RGB', 'RGBA'):
+                image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+            for variant, size in VARIANTS.items():
+                resized = image.copy()
+                resized.thumbnail((size, size), Image.Resampling.LANCZOS)
+                widths[variant] = resized.width
+                name = variant_name(field_file.name, variant)
+                if default_storage.exists(name):
+                    continue  # Left by an earlier, interrupted run
+                buffer = BytesIO()
+                resized.save(buffer, VARIANT_FORMAT, quality=VARIANT_QUALITY, method=4)
+                default_storage.save(name, ContentFile(buffer.getvalue()))
+    finally:
+        field_file.close()
+    default_storage.save(widths_name(field_file.name), ContentFile(json.dumps(widths)))
+
+
+def delete_variants(name):
+    default_storage.delete(widths_name(name))
+    for variant in VARIANTS:
+        default_storage.delete(variant_name(name, variant))
+
+
+def variant_urls(field_file):
+    """URLs of every variant of an ImageField file, plus their ``srcset``.
+
+    Variants are queued at upload time (core.tasks.queue_variants). Until the
+    worker has written them this serves the original, with no srcset. Only
+    looks, never queues: it runs while rendering pages.
+    """
+    if not field_file:
+        return {}
+    widths = variant_widths(field_file.name)
+    if widths is None:
+        urls = {variant: field_file.url for variant in VARIANTS}
+        urls['srcset'] = ''
+        return urls
+    urls = {variant: default_storage.url(variant_name(field_file.name, variant)) for variant in VARIANTS}
+    urls['srcset'] = srcset(urls, widths)
+    return urls
+
+
+def srcset(urls, widths):
+    # Variants of a small original can share a width; the smallest file wins
+    candidates = {}
+    for variant in VARIANTS:
+        candidates.setdefault(widths[variant], urls[variant])
+    return ', '.join(f"{url} {width}w" for width, url in candidates.items())
@@ -0,0 +1,125 @@
+import hashlib
+import os
+import tempfile
+from functools import wraps
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile, UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+
+# Uploads are written here while they arrive. It is inside MEDIA_ROOT, so
+# the storage moves the finished file into place with a rename, not a copy.
+INCOMING_DIR = '.incoming'
+# Room for the other form fields next to the largest allowed image
+FORM_OVERHEAD = 64 * 1024
+HEADER_SIZE = 12
+
+UPLOAD_ERRORS = {
+    'too_large': "La imagen es demasiado grande.",
+    'not_an_image': "El archivo no es una imagen.",
+}
+
+
+def incoming_dir():
+    path = os.path.join(settings.MEDIA_ROOT, INCOMING_DIR)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def is_image_header(header):
+    """Whether the first bytes of a file look like a JPEG, PNG, GIF or WebP."""
+    return (
+        header.startswith((b'\xff\xd8\xff', b'\x89PNG\r\n\x1a\n', b'GIF87a', b'GIF89a'))
+        or (header[:4] == b'RIFF' and header[8:12] == b'WEBP')
+    )
+
+
+def upload_error(request):
+    """Message for an upload the handler rejected on this request, if any."""
+    request.FILES  # The handler only runs once the body is parsed
+    code = getattr(request, 'upload_error', None)
+    return UPLOAD_ERRORS.get(code) if code else None
+
+
+class IncomingUploadedFile(TemporaryUploadedFile):
+    """A TemporaryUploadedFile kept in MEDIA_ROOT instead of the system temp dir.
+
+    ``sha256`` is filled in by the upload handler, so content-addressed
+    storage doesn't have to read the file again.
+    """
+
+    def __init__(self, name, content_type, size, charset, content_type_extra=None):
+        _, ext = os.path.splitext(name)
+        file = tempfile.NamedTemporaryFile(suffix='.upload' + ext, dir=incoming_dir())
+        UploadedFile.__init__(self, file, name, content_type, size, charset, content_type_extra)
+        self.sha256 = None
+
+
+class ImageUploadHandler(FileUploadHandler):
+    """Stream image uploads to disk, hashing and checking them on the way.
+
+    Files in a request larger than IMAGE_UPLOAD_MAX_SIZE are skipped without
+    being written; files that don't start like an image, or grow past the
+    limit, are dropped as soon as that is known. The other form fields (the
+    CSRF token among them) are still parsed. Either way ``request.upload_error``
+    says why (see ``upload_error``). Installed per view with ``image_uploads``.
+    """
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        self.request_length = content_length
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        if self.request_length > settings.IMAGE_UPLOAD_MAX_SIZE + FORM_OVERHEAD:
+            self.request.upload_error = 'too_large'
+            raise SkipFile
+        self.file = IncomingUploadedFile(self.file_name, self.content_type, 0, self.charset, self.content_type_extra)
+        self.sha = hashlib.sha256()
+        self.header = b''
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.IMAGE_UPLOAD_MAX_SIZE:
+            self.reject('too_large')
+        if len(self.header) < HEADER_SIZE:
+            self.header += raw_data[:HEADER_SIZE - len(self.header)]
+            if len(self.header) == HEADER_SIZE and not is_image_header(self.header):
+                self.reject('not_an_image')
+        self.sha.update(raw_data)
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        if len(self.header) < HEADER_SIZE and not is_image_header(self.header):
+            # Too late for SkipFile; returning nothing leaves it out of FILES
+            self.request.upload_error = 'not_an_image'
+            self.file.close()
+            return None
+        self.file.seek(0)
+        self.file.size = file_size
+        self.file.sha256 = self.sha.hexdigest()
+        return self.file
+
+    def reject(self, error):
+        self.request.upload_error = error
+        self.file.close()  # Deletes the partial file
+        raise SkipFile
+
+
+def image_uploads(view):
+    """Parse the files posted to ``view`` with ImageUploadHandler.
+
+    The handlers have to be in place before anything reads POST, which the
+    CSRF middleware does, so the check moves inside: the middleware skips
+    the view and ``csrf_protect`` runs once the handler is set.
+    """
+    if not getattr(view, 'csrf_exempt', False):
+        view = csrf_protect(view)
+
+    @csrf_exempt
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        request.upload_handlers = [ImageUploadHandler(request)]
+        return view(request, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,117 @@
+"""Resumable uploads for flaky connections.
+
+The browser announces a file (``start_upload``), then sends it in chunks of
+at most UPLOAD_CHUNK_SIZE bytes, each tagged with the offset it starts at
+(``append_chunk``). If a chunk is lost it asks for the current offset and
+carries on from there. Once complete, the form that wanted the image
+(gallery upload, chat message) posts the upload id instead of the file, and
+``uploaded_image`` hands the assembled file to the ImageField. The partial
+file already lives in MEDIA_ROOT, so storing it is a rename.
+"""
+import fcntl
+import hashlib
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
+from django.utils import timezone
+
+from .models import ChunkedUpload
+from .uploadhandlers import HEADER_SIZE, is_image_header
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# Unfinished uploads older than this are thrown away
+STALE_AFTER = timedelta(days=1)
+
+
+class UploadError(Exception):
+    def __init__(self, code, offset=None):
+        super().__init__(code)
+        self.code = code
+        self.offset = offset
+
+
+class AssembledUpload(UploadedFile):
+    """A finished chunked upload, handed to a FileField like a regular upload."""
+
+    def __init__(self, path, name, size, sha256):
+        super().__init__(open(path, 'rb'), name, None, size)
+        self.path = path
+        self.sha256 = sha256
+
+    def temporary_file_path(self):
+        # Lets FileSystemStorage move the file instead of copying it
+        return self.path
+
+    def close(self):
+        super().close()
+        # Still here if the storage didn't need it (same content already stored)
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def purge_stale_uploads():
+    for upload in ChunkedUpload.objects.filter(created_at__lt=timezone.now() - STALE_AFTER):
+        upload.discard()
+
+
+def start_upload(user, filename, size):
+    if size <= 0:
+        raise UploadError('not_an_image')
+    if size > settings.IMAGE_UPLOAD_MAX_SIZE:
+        raise UploadError('too_large')
+    purge_stale_uploads()
+    upload = ChunkedUpload.objects.create(user=user, filename=os.path.basename(filename)[:255], size=size)
+    open(upload.path, 'wb').close()
+    return upload
+
+
+def append_chunk(upload, offset, data):
+    """Write ``data`` at ``offset``, which has to be where the file ends now.
+
+    Returns the new offset. Raises UploadError('offset_mismatch') with the
+    actual offset when the client is out of sync (e.g. a retried chunk that
+    did arrive the first time).
+    """
+    with open(upload.path, 'ab') as part:
+        # Serialise concurrent retries of the same upload
+        fcntl.flock(part, fcntl.LOCK_EX)
+        received = part.seek(0, os.SEEK_END)
+        if offset != received:
+            raise UploadError('offset_mismatch', received)
+        if received + len(data) > upload.size:
+            upload.discard()
+            raise UploadError('too_large')
+        if offset == 0 and not is_image_header(data[:HEADER_SIZE]):
+            upload.discard()
+            raise UploadError('not_an_image')
+        part.write(data)
+        return received + len(data)
+
+
+def claim_upload(user, upload_id):
+    """The finished upload ``upload_id`` of ``user`` as a file, or None."""
+    try:
+        upload = ChunkedUpload.objects.filter(id=upload_id, user=user).first()
+    except ValidationError:
+        return None  # Not a UUID
+    if upload is None or upload.received() != upload.size:
+        return None
+
+    sha = hashlib.sha256()
+    with open(upload.path, 'rb') as part:
+        while chunk := part.read(UPLOAD_CHUNK_SIZE):
+            sha.update(chunk)
+    file = AssembledUpload(upload.path, upload.filename, upload.size, sha.hexdigest())
+    upload.delete()
+    return file
+
+
+def uploaded_image(request, field='image'):
+    """The image of a form post: a regular upload or a finished chunked one."""
+    if request.FILES.get(field):
+        return request.FILES[field]
+    upload_id = request.POST.get('upload_id')
+    return claim_upload(request.user, upload_id) if upload_id else None
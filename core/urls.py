@@ -9,4 +9,10 @@ urlpatterns = [
     path('announcements/add/', views.add_announcement, name='add_announcement'),
     path('announcements/delete/<int:announcement_id>/', views.delete_announcement, name='delete_announcement'),
     path('mood/add/', views.create_mood, name='create_mood'),
+    path('mood/history/', views.mood_history, name='mood_history'),
+    path('mood/history/data/', views.mood_history_data, name='mood_history_data'),
+    path('metrics/', views.metrics, name='metrics'),
+    path('export/', views.export_space, name='export_space'),
+    path('uploads/', views.upload_start, name='upload_start'),
+    path('uploads/<uuid:upload_id>/', views.upload_chunk, name='upload_chunk'),
 ]
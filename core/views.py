@@ -1,10 +1,21 @@
 from django.shortcuts import render, redirect
-from django.contrib.auth import authenticate, login, logout
+from django.http import JsonResponse, HttpResponse, Http404, StreamingHttpResponse
+from django.conf import settings
+from django.db import transaction
+from django.contrib.auth.models import User
+from django.contrib.auth import login, logout
 from django.contrib.auth.forms import AuthenticationForm
 from django.contrib.auth.decorators import login_required, user_passes_test
-from .models import DailyPhrase, Announcement, Mood, MoodEntry
-import random
+from django.views.decorators.http import require_POST, require_http_methods
 from django.utils import timezone
+from .backup import export_chunks
+from .models import DailyPhrase, Announcement, Mood, MoodEntry, ChunkedUpload
+from .moods import MOODS, get_mood, icon_html, DEFAULT_GRADIENT
+from .history import PERIODS, record_mood, distribution, streaks
+from .metrics import registry
+from .uploadhandlers import UPLOAD_ERRORS
+from .uploads import UPLOAD_CHUNK_SIZE, UploadError, start_upload, append_chunk
+from .selection import random_phrase, random_announcement, current_period
 
 def login_view(request):
     if request.user.is_authenticated:
@@ -13,12 +24,9 @@ def login_view(request):
     if request.method == 'POST':
         form = AuthenticationForm(request, data=request.POST)
         if form.is_valid():
-            username = form.cleaned_data.get('username')
-            password = form.cleaned_data.get('password')
-            user = authenticate(username=username, password=password)
-            if user is not None:
-                login(request, user)
-                return redirect('home')
+            # The form already authenticated the user, don't hash the password twice
+            login(request, form.get_user())
+            return redirect('home')
     else:
         form = AuthenticationForm()
     
@@ -30,58 +38,20 @@ def logout_view(request):
 
 @login_required(login_url='login')
 def home(request):
-    # Get random active phrase
-    phrases = DailyPhrase.objects.filter(is_active=True)
-    hero_phrase = random.choice(phrases) if phrases else None
-    
-    # Get active announcement based on time of day
-    now = timezone.now()
-    hour = now.hour
-    
-    current_period = 'ALL'
-    if 5 <= hour < 12:
-        current_period = 'MORNING'
-    elif 12 <= hour < 20:
-        current_period = 'AFTERNOON'
-    else:
-        current_period = 'EVENING'
-    
-    # extensive filtering: either ALL or current period
-    announcements = Announcement.objects.filter(
-        is_active=True,
-        time_of_day__in=['ALL', current_period]
-    )
-    
-    announcement = random.choice(announcements) if announcements else None
+    # Random phrase and time-of-day announcement, picked from cached id lists
+    hero_phrase = random_phrase()
+    announcement = random_announcement(current_period())
 
     # Mood Logic
     latest_my_mood = MoodEntry.objects.filter(user=request.user).order_by('-created_at').first()
     latest_other_mood = MoodEntry.objects.exclude(user=request.user).order_by('-created_at').first()
     
     # Background Gradient Logic based on latest_my_mood
-    bg_gradient = "linear-gradient(-45deg, #96a977, #81c784, #007F7A, #26a69a)" # Default
+    bg_gradient = DEFAULT_GRADIENT
     if latest_my_mood:
-        gradients = {
-            'happy': "linear-gradient(135deg, #fff9c4 0%, #ffeb3b 50%, #fbc02d 100%)", # Gold/Yellow
-            'feliz': "linear-gradient(135deg, #fff9c4 0%, #ffeb3b 50%, #fbc02d 100%)", # Gold/Yellow
-            
-            'calm': "linear-gradient(135deg, #e3f2fd 0%, #bbdefb 50%, #90caf9 100%)", # Sky Blue
-            'calmado': "linear-gradient(135deg, #e3f2fd 0%, #bbdefb 50%, #90caf9 100%)", # Sky Blue
-            'tranqui': "linear-gradient(135deg, #e3f2fd 0%, #bbdefb 50%, #90caf9 100%)", # Sky Blue
-            
-            'tired': "linear-gradient(135deg, #f5f5f5 0%, #e0e0e0 50%, #bdbdbd 100%)", # Soft Gray
-            'cansado': "linear-gradient(135deg, #f5f5f5 0%, #e0e0e0 50%, #bdbdbd 100%)", # Soft Gray
-            
-            'sad': "linear-gradient(135deg, #c5cae9 0%, #9fa8da 50%, #7986cb 100%)", # Indigo/Lavenderish
-            'triste': "linear-gradient(135deg, #c5cae9 0%, #9fa8da 50%, #7986cb 100%)", # Indigo/Lavenderish
-            
-            'angry': "linear-gradient(135deg, #ffcdd2 0%, #ef9a9a 50%, #e57373 100%)", # Soft Red
-            'enojado': "linear-gradient(135deg, #ffcdd2 0%, #ef9a9a 50%, #e57373 100%)", # Soft Red
-            
-            'love': "linear-gradient(135deg, #f8bbd0 0%, #f48fb1 50%, #f06292 100%)", # Rose/Pink
-            'amoroso': "linear-gradient(135deg, #f8bbd0 0%, #f48fb1 50%, #f06292 100%)", # Rose/Pink
-        }
-        bg_gradient = gradients.get(latest_my_mood.mood, bg_gradient)
+        mood = get_mood(latest_my_mood.mood)
+        if mood:
+            bg_gradient = mood.gradient
     
     context = {
         'hero_phrase': hero_phrase,
@@ -98,13 +68,66 @@ def create_mood(request):
         mood = request.POST.get('mood')
         note = request.POST.get('note', '').strip()
         if mood in [choice[0] for choice in MoodEntry.MOOD_CHOICES]:
-            MoodEntry.objects.create(
-                user=request.user,
-                mood=mood,
-                note=note[:255]
-            )
+            with transaction.atomic():
+                entry = MoodEntry.objects.create(
+                    user=request.user,
+                    mood=mood,
+                    note=note[:255]
+                )
+                record_mood(entry)
     return redirect('home')
 
+def history_users(request):
+    # Me plus the other person in the space, if there is one
+    users = [request.user]
+    other = User.objects.exclude(pk=request.user.pk).order_by('id').first()
+    if other:
+        users.append(other)
+    return users
+
+def mood_stats(user, period):
+    return {
+        'user': user.username,
+        'streaks': streaks(user),
+        'buckets': distribution(user, period),
+    }
+
+@login_required(login_url='login')
+def mood_history(request):
+    period = request.GET.get('period', 'day')
+    if period not in PERIODS:
+        period = 'day'
+
+    stats = [mood_stats(user, period) for user in history_users(request)]
+    # Bar segment widths as percentages of each bucket's total
+    for entry in stats:
+        for bucket in entry['buckets']:
+            bucket['segments'] = [
+                {'mood': MOODS[key], 'count': count, 'width': 100 * count / bucket['total']}
+                for key, count in bucket['counts'].items() if count
+            ]
+
+    context = {
+        'period': period,
+        'periods': list(PERIODS),
+        'stats': stats,
+        'legend': [(mood, icon_html(mood)) for mood in MOODS.values()],
+    }
+    return render(request, 'core/mood_history.html', context)
+
+@login_required(login_url='login')
+def mood_history_data(request):
+    period = request.GET.get('period', 'day')
+    if period not in PERIODS:
+        return JsonResponse({'status': 'error'}, status=400)
+
+    data = []
+    for user in history_users(request):
+        entry = mood_stats(user, period)
+        entry['is_user'] = user.pk == request.user.pk
+        data.append(entry)
+    return JsonResponse({'period': period, 'moods': list(MOODS), 'users': data})
+
 @user_passes_test(lambda u: u.is_staff)
 def manage_announcements(request):
     announcements = Announcement.objects.all().order_by('-created_at')
@@ -128,3 +151,55 @@ def delete_announcement(request, announcement_id):
     if request.method == 'POST':
         Announcement.objects.filter(id=announcement_id).delete()
     return redirect('manage_announcements')
+
+@user_passes_test(lambda u: u.is_staff)
+def metrics(request):
+    if not settings.METRICS_ENABLED:
+        raise Http404
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@user_passes_test(lambda u: u.is_staff)
+def export_space(request):
+    # Streamed as it is built, so a large space doesn't sit in memory
+    response = StreamingHttpResponse(export_chunks(), content_type='application/zip')
+    filename = f"shared-space-{timezone.localtime():%Y%m%d-%H%M%S}.zip"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+@login_required
+@require_POST
+def upload_start(request):
+    try:
+        size = int(request.POST.get('size', ''))
+        upload = start_upload(request.user, request.POST.get('filename', ''), size)
+    except ValueError:
+        return JsonResponse({'status': 'error'}, status=400)
+    except UploadError as e:
+        return JsonResponse({'status': 'error', 'error': UPLOAD_ERRORS[e.code]}, status=400)
+    return JsonResponse({'id': str(upload.id), 'offset': 0, 'chunk_size': UPLOAD_CHUNK_SIZE})
+
+@login_required
+@require_http_methods(['GET', 'POST'])
+def upload_chunk(request, upload_id):
+    upload = ChunkedUpload.objects.filter(id=upload_id, user=request.user).first()
+    if upload is None:
+        return JsonResponse({'status': 'error'}, status=404)
+    if request.method == 'GET':
+        # Where to resume after a failed chunk
+        return JsonResponse({'offset': upload.received(), 'size': upload.size})
+
+    try:
+        offset = int(request.GET.get('offset', ''))
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        return JsonResponse({'status': 'error'}, status=400)
+    if not 0 < length <= UPLOAD_CHUNK_SIZE:
+        return JsonResponse({'status': 'error'}, status=413)
+
+    try:
+        received = append_chunk(upload, offset, request.read(length))
+    except UploadError as e:
+        if e.code == 'offset_mismatch':
+            return JsonResponse({'status': 'error', 'offset': e.offset}, status=409)
+        return JsonResponse({'status': 'error', 'error': UPLOAD_ERRORS[e.code]}, status=400)
+    return JsonResponse({'offset': received, 'complete': received == upload.size})
@@ -0,0 +1,19 @@
+# Generated by Django 6.0.2 on 2026-10-18 17:48
+
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gallery', '0003_photo_created_id_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='photo',
+            name='image',
+            field=models.ImageField(storage=core.storage.ContentAddressedStorage(), upload_to='gallery/'),
+        ),
+    ]
@@ -1,12 +1,15 @@
 from django.db import models
 from django.contrib.auth.models import User
+from core.storage import blob_storage
 
 class Photo(models.Model):
-    image = models.ImageField(upload_to='gallery/')
+    image = models.ImageField(upload_to='gallery/', storage=blob_storage, db_index=True)
     description = models.CharField(max_length=500, blank=True)
     uploader = models.ForeignKey(User, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
 
-    def delete(self, *args, **kwargs):
-        self.image.delete()
-        super().delete(*args, **kwargs)
+    class Meta:
+        indexes = [
+            # Keyset pagination cursor for the grid
+            models.Index(fields=['created_at', 'id'], name='gallery_photo_created_id_idx'),
+        ]
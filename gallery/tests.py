@@ -1,3 +1,134 @@
-from django.test import TestCase
+import os
+import time
+from io import BytesIO
 
-# Create your tests here.
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from chat.models import Message
+from core.storage import blob_storage
+from core.tasks import BLOB_GRACE_SECONDS, collect_blob
+from core.testing import QueryBudgetTestCase, SpaceFixtureMixin, SEED_IMAGE, SEED_PHOTOS
+from core.uploadhandlers import FORM_OVERHEAD, UPLOAD_ERRORS
+from jobs.queue import jobs_for
+from .models import Photo
+
+
+def png_upload(name='foto.png'):
+    buffer = BytesIO()
+    Image.new('RGB', (64, 48), 'teal').save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+class GalleryQueryBudgetTests(QueryBudgetTestCase):
+    @classmethod
+    def seed(cls):
+        cls.seed_image_variants()
+        Photo.objects.bulk_create(
+            Photo(image=SEED_IMAGE, description=f"Foto {i}", uploader=cls.user)
+            for i in range(SEED_PHOTOS)
+        )
+        cls.photo = Photo.objects.first()
+
+    def test_index(self):
+        response = self.assertBudget(2, reverse('gallery_index'))
+        self.assertContains(response, 'class="photo-item"', count=24)
+
+    def test_index_cached(self):
+        self.client.get(reverse('gallery_index'))
+        self.assertBudget(1, reverse('gallery_index'))
+
+    def test_deep_page(self):
+        # Keyset pagination: page N costs the same as page 1
+        cursor = self.client.get(reverse('photo_page')).json()['next_cursor']
+        for _ in range(5):
+            cursor = self.assertBudget(2, reverse('photo_page'), data={'cursor': cursor}).json()['next_cursor']
+
+    def test_detail(self):
+        self.assertBudget(1, reverse('photo_detail', args=[self.photo.id]))
+
+    def test_edit_description(self):
+        self.assertBudget(3, reverse('photo_detail', args=[self.photo.id]), 'post',
+                          {'description': 'Playa'}, status=302)
+
+    def test_upload(self):
+        # Includes queueing the resize job, unless one already failed
+        self.assertBudget(4, reverse('upload_photo'), 'post', {'image': png_upload()}, status=302)
+
+    def test_delete(self):
+        # Includes queueing the blob for collection
+        self.assertBudget(4, reverse('delete_photo', args=[self.photo.id]), 'post', status=302)
+
+
+class BlobCollectionTests(SpaceFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.first = Photo.objects.create(image=png_upload(), uploader=self.user)
+        self.second = Photo.objects.create(image=png_upload('otra.png'), uploader=self.user)
+        self.name = self.first.image.name
+        self.assertEqual(self.second.image.name, self.name)
+
+    def age_blob(self):
+        past = time.time() - BLOB_GRACE_SECONDS - 1
+        os.utime(blob_storage.path(self.name), (past, past))
+
+    def test_shared_blob_kept(self):
+        self.first.delete()
+        self.age_blob()
+        collect_blob(self.name)
+        self.assertTrue(blob_storage.exists(self.name))
+
+    def test_unreferenced_blob_deleted(self):
+        self.first.delete()
+        self.second.delete()
+        self.assertEqual(jobs_for(collect_blob, name=self.name).count(), 2)
+        self.age_blob()
+        collect_blob(self.name)
+        self.assertFalse(blob_storage.exists(self.name))
+
+    def test_queryset_delete_queued(self):
+        Photo.objects.filter(id=self.first.id).delete()
+        self.assertEqual(jobs_for(collect_blob, name=self.name).count(), 1)
+
+    def test_cascade_delete_queued(self):
+        # The user's photos and chat images go with the user
+        Message.objects.create(user=self.user, image=png_upload('chat.png'))
+        self.user.delete()
+        self.assertEqual(jobs_for(collect_blob, name=self.name).count(), 3)
+
+    def test_reuploaded_blob_kept(self):
+        self.first.delete()
+        self.second.delete()
+        self.age_blob()
+        # Saved again by an upload whose row isn't there yet
+        blob_storage.save('gallery/foto.png', png_upload())
+        collect_blob(self.name)
+        self.assertTrue(blob_storage.exists(self.name))
+
+
+class UploadErrorTests(SpaceFixtureMixin, TestCase):
+    def form_client(self):
+        # A browser form post: CSRF token in the body, checked as usual
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.user)
+        client.get(reverse('gallery_index'))
+        return client, client.cookies['csrftoken'].value
+
+    @override_settings(IMAGE_UPLOAD_MAX_SIZE=1024)
+    def test_too_large_form_post(self):
+        client, token = self.form_client()
+        big = SimpleUploadedFile('grande.png', b'\x89PNG\r\n\x1a\n' + b'0' * (FORM_OVERHEAD + 2048))
+        response = client.post(reverse('upload_photo'), {'csrfmiddlewaretoken': token, 'image': big},
+                               HTTP_ACCEPT='text/html')
+        self.assertRedirects(response, reverse('gallery_index'), fetch_redirect_response=False)
+        self.assertFalse(Photo.objects.exists())
+        page = client.get(reverse('gallery_index'))
+        self.assertContains(page, UPLOAD_ERRORS['too_large'])
+
+    def test_not_an_image_fetch(self):
+        text = SimpleUploadedFile('nota.png', b'esto no es una imagen')
+        response = self.client.post(reverse('upload_photo'), {'image': text}, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], UPLOAD_ERRORS['not_an_image'])
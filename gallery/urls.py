@@ -3,6 +3,7 @@ from . import views
 
 urlpatterns = [
     path('', views.index, name='gallery_index'),
+    path('page/', views.photo_page, name='photo_page'),
     path('photo/<int:photo_id>/', views.photo_detail, name='photo_detail'),
     path('upload/', views.upload_photo, name='upload_photo'),
     path('delete/<int:photo_id>/', views.delete_photo, name='delete_photo'),
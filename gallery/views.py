@@ -1,15 +1,49 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.template.loader import render_to_string
+from django.core.cache import cache
+from functools import partial
 from .models import Photo
+from core.cache import FRAGMENT_TIMEOUT, conditional, fragment_context, versioned_key
+from core.pagination import decode_cursor, keyset_page
+from core.tasks import queue_variants
+from core.uploadhandlers import image_uploads, upload_error
+from core.uploads import uploaded_image
+
+PAGE_SIZE = 24
 
 @login_required
+@conditional('gallery', vary_csrf=True)
 def index(request):
-    photos = Photo.objects.all().order_by('-created_at')
-    return render(request, 'gallery/index.html', {'photos': photos})
+    # Called by the template, so the first page is only queried when the
+    # cached grid fragment has to be re-rendered
+    first_page = partial(keyset_page, Photo.objects.all(), 'created_at', None, PAGE_SIZE)
+    return render(request, 'gallery/index.html', {'first_page': first_page, **fragment_context(request, 'gallery')})
+
+@login_required
+@conditional('gallery')
+def photo_page(request):
+    # Next batch of grid tiles for infinite scroll
+    cursor = request.GET.get('cursor')
+    try:
+        if cursor:
+            decode_cursor(cursor)
+    except ValueError:
+        return JsonResponse({'status': 'error'}, status=400)
+    key = versioned_key('gallery', 'page', cursor, request=request)
+    data = cache.get(key)
+    if data is None:
+        photos, next_cursor = keyset_page(Photo.objects.all(), 'created_at', cursor, PAGE_SIZE)
+        html = render_to_string('gallery/_photo_tiles.html', {'photos': photos}, request)
+        data = {'html': html, 'next_cursor': next_cursor}
+        cache.set(key, data, FRAGMENT_TIMEOUT)
+    return JsonResponse(data)
 
 @login_required
 def photo_detail(request, photo_id):
-    photo = get_object_or_404(Photo, id=photo_id)
+    photo = get_object_or_404(Photo.objects.select_related('uploader'), id=photo_id)
     if request.method == 'POST':
         if 'delete' in request.POST:
             photo.delete()
@@ -23,13 +57,27 @@ def photo_detail(request, photo_id):
     return render(request, 'gallery/detail.html', {'photo': photo})
 
 @login_required
+@image_uploads
 def upload_photo(request):
-    if request.method == 'POST' and request.FILES.get('image'):
-        Photo.objects.create(
-            image=request.FILES['image'],
-            description=request.POST.get('description', ''),
-            uploader=request.user
-        )
+    if request.method == 'POST':
+        error = upload_error(request)
+        if error:
+            if request.accepts('text/html'):
+                # Plain form post
+                messages.error(request, error)
+                return redirect('gallery_index')
+            return JsonResponse({'status': 'error', 'error': error}, status=400)
+        image = uploaded_image(request)
+        if image:
+            try:
+                photo = Photo.objects.create(
+                    image=image,
+                    description=request.POST.get('description', ''),
+                    uploader=request.user
+                )
+            finally:
+                image.close()
+            queue_variants(photo.image)
     return redirect('gallery_index')
 
 @login_required
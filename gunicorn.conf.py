@@ -0,0 +1,73 @@
+"""gunicorn settings, read automatically when gunicorn starts in this directory.
+
+GUNICORN_PROFILE picks how requests are served:
+
+- ``gthread`` (default): WSGI with a few threads per worker. Chat polls are
+  short, so one slow upload only holds one thread, not a whole worker.
+- ``uvicorn``: ASGI (shared_space/asgi.py) on uvicorn workers. The chat
+  stream stays open and pushes messages as they are sent, but every other
+  view is synchronous and Django runs those one at a time per worker.
+- ``sync``: one request per worker, gunicorn's default.
+
+Under the WSGI profiles /chat/stream/ answers right away and the browser
+reconnects every few seconds, so it never holds a thread (chat/views.py).
+
+Counts derive from the CPUs and can be overridden with WEB_CONCURRENCY and
+GUNICORN_THREADS. See the README for a comparison under chat polling load.
+"""
+import multiprocessing
+import os
+
+cpus = multiprocessing.cpu_count()
+profile = os.environ.get('GUNICORN_PROFILE', 'gthread')
+
+PROFILES = {
+    'gthread': {
+        'worker_class': 'gthread',
+        'wsgi_app': 'shared_space.wsgi:application',
+        'workers': cpus + 1,
+        'threads': 4,
+    },
+    'uvicorn': {
+        'worker_class': 'uvicorn_worker.UvicornWorker',
+        'wsgi_app': 'shared_space.asgi:application',
+        'workers': cpus + 1,
+        'threads': 1,
+    },
+    'sync': {
+        'worker_class': 'sync',
+        'wsgi_app': 'shared_space.wsgi:application',
+        'workers': cpus * 2 + 1,
+        'threads': 1,
+    },
+}
+if profile not in PROFILES:
+    raise RuntimeError(f"GUNICORN_PROFILE must be one of {', '.join(PROFILES)}, not {profile!r}")
+
+worker_class = PROFILES[profile]['worker_class']
+wsgi_app = PROFILES[profile]['wsgi_app']
+workers = int(os.environ.get('WEB_CONCURRENCY', PROFILES[profile]['workers']))
+threads = int(os.environ.get('GUNICORN_THREADS', PROFILES[profile]['threads']))
+
+# Sessions and the logged-in user are cached (core/sessions.py, core/auth.py):
+# with a per-process cache, a logout in one worker wouldn't reach the others
+if workers > 1 and os.environ.get('CACHE_BACKEND', 'file') == 'locmem':
+    raise RuntimeError("CACHE_BACKEND=locmem is per process; use file or db with more than one worker")
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+
+# Import Django once in the master; workers fork with it already loaded
+preload_app = True
+# Polling tabs reuse their connection between polls
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+# Recycle workers now and then, staggered so they don't all restart at once
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = max_requests // 10
+# Long enough for a large upload on a slow connection
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+# Heartbeat files in memory, not on a possibly slow disk
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG')
@@ -0,0 +1,50 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from jobs.models import Job
+from jobs.queue import claim_next, prune, run_job, requeue_stale
+
+# How often a long-running worker clears out old finished jobs
+PRUNE_INTERVAL_SECONDS = 3600
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs (image processing etc.)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Exit when the queue is empty")
+        parser.add_argument('--sleep', type=float, default=2.0, help="Seconds to wait when idle")
+        parser.add_argument('--stale-minutes', type=int, default=15,
+                            help="Requeue jobs stuck in RUNNING for longer than this")
+        parser.add_argument('--status', action='store_true', help="Print job counts and exit")
+
+    def handle(self, *args, **options):
+        if options['status']:
+            for row in Job.objects.values('status').annotate(n=Count('id')).order_by('status'):
+                self.stdout.write(f"{row['status']}: {row['n']}")
+            return
+
+        requeued, failed = requeue_stale(timedelta(minutes=options['stale_minutes']))
+        if requeued:
+            self.stdout.write(f"Requeued {requeued} stale job(s)")
+        if failed:
+            self.stdout.write(f"Failed {failed} stale job(s) out of attempts")
+
+        next_prune = 0
+        while True:
+            if time.monotonic() >= next_prune:
+                pruned = prune()
+                if pruned:
+                    self.stdout.write(f"Pruned {pruned} old job(s)")
+                next_prune = time.monotonic() + PRUNE_INTERVAL_SECONDS
+            job = claim_next()
+            if job is None:
+                if options['once']:
+                    return
+                time.sleep(options['sleep'])
+                continue
+            job = run_job(job)
+            self.stdout.write(f"{job.task} #{job.id}: {job.status}")
@@ -0,0 +1,100 @@
+import traceback
+from datetime import timedelta
+
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+RETRY_DELAY_SECONDS = 10
+STALE_ERROR = "The worker stopped while running this job, on every attempt"
+# Finished jobs are kept this long for inspection. Failed ones stay longer:
+# they are also what stops a broken task from being queued over and over.
+DONE_RETENTION = timedelta(days=1)
+FAILED_RETENTION = timedelta(days=30)
+
+_tasks = {}
+
+
+def task(func):
+    """Register ``func`` so workers can run it by name."""
+    func.task_name = f"{func.__module__}.{func.__name__}"
+    _tasks[func.task_name] = func
+    return func
+
+
+def enqueue(func, max_attempts=3, delay=0, **payload):
+    """Queue a registered task, due in ``delay`` seconds; ``payload`` must be JSON serializable."""
+    return Job.objects.create(
+        task=func.task_name, payload=payload, max_attempts=max_attempts,
+        run_after=timezone.now() + timedelta(seconds=delay),
+    )
+
+
+def jobs_for(func, **payload):
+    """Jobs of task ``func`` whose payload includes ``payload``."""
+    return Job.objects.filter(task=func.task_name, **{f'payload__{key}': value for key, value in payload.items()})
+
+
+def claim_next():
+    """Mark the next due job as running and return it, or None.
+
+    The conditional UPDATE makes claiming safe with several workers: only one
+    of them can move a given row out of PENDING.
+    """
+    now = timezone.now()
+    due = Job.objects.filter(status='PENDING', run_after__lte=now).values_list('id', flat=True)[:10]
+    for job_id in due:
+        claimed = Job.objects.filter(id=job_id, status='PENDING').update(
+            status='RUNNING', attempts=F('attempts') + 1, updated_at=now
+        )
+        if claimed:
+            return Job.objects.get(id=job_id)
+    return None
+
+
+def run_job(job):
+    func = _tasks.get(job.task)
+    try:
+        if func is None:
+            raise LookupError(f"Unknown task {job.task}")
+        func(**job.payload)
+    except Exception:
+        job.last_error = traceback.format_exc()
+        if job.attempts < job.max_attempts:
+            # Exponential backoff: 10s, 20s, 40s...
+            delay = RETRY_DELAY_SECONDS * 2 ** (job.attempts - 1)
+            job.status = 'PENDING'
+            job.run_after = timezone.now() + timedelta(seconds=delay)
+        else:
+            job.status = 'FAILED'
+    else:
+        job.status = 'DONE'
+        job.last_error = ''
+    job.save(update_fields=['status', 'last_error', 'run_after', 'updated_at'])
+    return job
+
+
+def requeue_stale(older_than):
+    """Put back jobs left RUNNING by a worker that died mid-task.
+
+    Jobs that have used up their attempts fail instead: a task that kills
+    its worker (out of memory on a decompression bomb, say) never gets to
+    ``run_job``'s error handling, and would otherwise run again forever.
+    Returns (requeued, failed).
+    """
+    now = timezone.now()
+    stale = Job.objects.filter(status='RUNNING', updated_at__lt=now - older_than)
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status='FAILED', last_error=STALE_ERROR, updated_at=now
+    )
+    requeued = stale.filter(attempts__lt=F('max_attempts')).update(status='PENDING', run_after=now)
+    return requeued, failed
+
+
+def prune():
+    """Delete old DONE and FAILED jobs; returns how many went."""
+    now = timezone.now()
+    done, _ = Job.objects.filter(status='DONE', updated_at__lt=now - DONE_RETENTION).delete()
+    failed, _ = Job.objects.filter(status='FAILED', updated_at__lt=now - FAILED_RETENTION).delete()
+    return done + failed
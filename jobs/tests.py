@@ -0,0 +1,118 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from core.tasks import generate_image_variants, queue_variants
+from core.testing import SpaceFixtureMixin
+from gallery.models import Photo
+
+from .models import Job
+from .queue import STALE_ERROR, claim_next, enqueue, jobs_for, prune, requeue_stale, run_job, task
+
+calls = []
+
+
+@task
+def record_call(value):
+    calls.append(value)
+
+
+@task
+def always_fail():
+    raise ValueError("broken")
+
+
+class QueueTests(SpaceFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        calls.clear()
+
+    def test_run(self):
+        job = enqueue(record_call, value=1)
+        claimed = claim_next()
+        self.assertEqual((claimed.id, claimed.status, claimed.attempts), (job.id, 'RUNNING', 1))
+        self.assertIsNone(claim_next())
+        run_job(claimed)
+        self.assertEqual(calls, [1])
+        self.assertEqual(Job.objects.get(id=job.id).status, 'DONE')
+
+    def test_retry_then_fail(self):
+        job = enqueue(always_fail, max_attempts=2)
+        run_job(claim_next())
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'PENDING')
+        self.assertGreater(job.run_after, timezone.now())
+        self.assertIsNone(claim_next())  # Backing off
+
+        Job.objects.filter(id=job.id).update(run_after=timezone.now())
+        run_job(claim_next())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('FAILED', 2))
+        self.assertIn('ValueError: broken', job.last_error)
+
+    def test_requeue_stale(self):
+        job = enqueue(record_call, value=1)
+        claim_next()
+        self.assertEqual(requeue_stale(timedelta(minutes=5)), (0, 0))
+        Job.objects.filter(id=job.id).update(updated_at=timezone.now() - timedelta(minutes=10))
+        self.assertEqual(requeue_stale(timedelta(minutes=5)), (1, 0))
+        self.assertEqual(claim_next().id, job.id)
+
+    def test_stale_out_of_attempts(self):
+        # A task that takes its worker down with it, on every attempt
+        job = enqueue(record_call, max_attempts=2, value=1)
+        for _ in range(2):
+            claim_next()
+            Job.objects.filter(id=job.id).update(updated_at=timezone.now() - timedelta(minutes=10))
+            requeue_stale(timedelta(minutes=5))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.last_error), ('FAILED', 2, STALE_ERROR))
+        self.assertIsNone(claim_next())
+
+    def test_prune(self):
+        now = timezone.now()
+        old_done = enqueue(record_call, value=1)
+        old_failed = enqueue(record_call, value=2)
+        recent_failed = enqueue(record_call, value=3)
+        pending = enqueue(record_call, value=4)
+        Job.objects.filter(id=old_done.id).update(status='DONE', updated_at=now - timedelta(days=2))
+        Job.objects.filter(id=old_failed.id).update(status='FAILED', updated_at=now - timedelta(days=31))
+        Job.objects.filter(id=recent_failed.id).update(status='FAILED', updated_at=now - timedelta(days=2))
+        Job.objects.filter(id=pending.id).update(updated_at=now - timedelta(days=60))
+
+        self.assertEqual(prune(), 2)
+        self.assertQuerySetEqual(Job.objects.order_by('id').values_list('id', flat=True),
+                                 [recent_failed.id, pending.id])
+
+    def test_run_jobs_once(self):
+        enqueue(record_call, value=1)
+        call_command('run_jobs', '--once', stdout=StringIO())
+        self.assertEqual(calls, [1])
+
+
+class VariantJobTests(SpaceFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        name = default_storage.save('blobs/cd/corrupt.jpg', ContentFile(b'not an image'))
+        self.photo = Photo.objects.create(image=name, uploader=self.user)
+
+    def test_queued_once(self):
+        queue_variants(self.photo.image)
+        queue_variants(self.photo.image)
+        self.assertEqual(jobs_for(generate_image_variants, pk=self.photo.pk).count(), 1)
+
+    def test_not_requeued_after_failure(self):
+        queue_variants(self.photo.image)
+        while job := claim_next():
+            run_job(job)
+            Job.objects.filter(status='PENDING').update(run_after=timezone.now())
+        job = jobs_for(generate_image_variants, pk=self.photo.pk).get()
+        self.assertEqual(job.status, 'FAILED')
+
+        call_command('queue_variants', stdout=StringIO())
+        self.assertEqual(jobs_for(generate_image_variants, pk=self.photo.pk).count(), 1)
@@ -0,0 +1,22 @@
+# Generated by Django 6.0.2 on 2026-10-18 19:05
+
+from django.db import migrations
+from django.utils.text import normalize_newlines
+
+
+def normalize_content(apps, schema_editor):
+    # Notes created through the form were stored with the browser's CRLF
+    Note = apps.get_model('notes', 'Note')
+    for note in Note.objects.filter(content__contains='\r').only('id', 'content').iterator():
+        Note.objects.filter(id=note.id).update(content=normalize_newlines(note.content))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0002_note_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_content, migrations.RunPython.noop),
+    ]
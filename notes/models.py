@@ -6,6 +6,8 @@ class Note(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Bumped on every edit; autosaves must name the version they were based on
+    version = models.PositiveIntegerField(default=1)
 
     def __str__(self):
         return f"Note by {self.user.username} at {self.created_at}"
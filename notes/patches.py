@@ -0,0 +1,31 @@
+"""Text splices sent by the notes autosave.
+
+A patch is a list of ``[start, end, text]`` ops: replace ``base[start:end]``
+with ``text``. Offsets are in characters (code points) of the base text, and
+the ops are sorted and don't overlap, so each one is applied to the original
+text rather than to the result of the previous one.
+"""
+
+
+class PatchError(ValueError):
+    pass
+
+
+def apply_patch(base, ops):
+    if not isinstance(ops, list):
+        raise PatchError("ops must be a list")
+    pieces = []
+    position = 0
+    for op in ops:
+        if not (isinstance(op, list) and len(op) == 3):
+            raise PatchError(f"bad op: {op!r}")
+        start, end, text = op
+        if not (type(start) is int and type(end) is int and isinstance(text, str)):
+            raise PatchError(f"bad op: {op!r}")
+        if not position <= start <= end <= len(base):
+            raise PatchError(f"op out of range or out of order: {op!r}")
+        pieces.append(base[position:start])
+        pieces.append(text)
+        position = end
+    pieces.append(base[position:])
+    return ''.join(pieces)
@@ -1,3 +1,79 @@
-from django.test import TestCase
+import json
 
-# Create your tests here.
+from django.urls import reverse
+
+from core.testing import QueryBudgetTestCase, SEED_NOTES
+from .models import Note
+
+
+class NotesQueryBudgetTests(QueryBudgetTestCase):
+    @classmethod
+    def seed(cls):
+        Note.objects.bulk_create(
+            Note(user=cls.user if i % 2 else cls.other, content=f"Nota {i}")
+            for i in range(SEED_NOTES)
+        )
+        cls.note = Note.objects.first()
+
+    def test_index(self):
+        response = self.assertBudget(2, reverse('notes_index'))
+        self.assertEqual(len(response.context['notes']), SEED_NOTES)
+
+    def test_index_cached(self):
+        self.client.get(reverse('notes_index'))
+        # The rendered list comes from the fragment cache
+        self.assertBudget(1, reverse('notes_index'))
+
+    def test_create(self):
+        self.assertBudget(2, reverse('create_note'), 'post', {'content': 'Nueva'}, status=302)
+
+    def test_update(self):
+        self.assertBudget(3, reverse('manage_note', args=[self.note.id]), 'post', {'content': 'Editada'}, status=302)
+
+    def test_delete(self):
+        self.assertBudget(3, reverse('manage_note', args=[self.note.id]), 'post', {'delete': 'true'}, status=302)
+
+    def test_autosave(self):
+        data = json.dumps({'version': self.note.version, 'base_length': len(self.note.content), 'ops': [[0, 0, 'Mi ']]})
+        # Locked read, the update and its search index write, in one transaction
+        response = self.assertBudget(5, reverse('autosave_note', args=[self.note.id]), 'post', data,
+                                     content_type='application/json')
+        self.assertEqual(response.json(), {'status': 'ok', 'version': self.note.version + 1})
+        self.note.refresh_from_db()
+        self.assertEqual(self.note.content, 'Mi Nota 0')
+
+    def test_autosave_stale(self):
+        Note.objects.filter(id=self.note.id).update(content='Nota editada', version=2)
+        data = json.dumps({'version': 1, 'base_length': len(self.note.content), 'ops': [[0, 4, 'Carta']]})
+        response = self.assertBudget(3, reverse('autosave_note', args=[self.note.id]), 'post', data,
+                                     content_type='application/json', status=409)
+        self.assertEqual(response.json(), {'status': 'conflict', 'version': 2, 'content': 'Nota editada'})
+
+    def test_autosave_bad_patch(self):
+        data = json.dumps({'version': self.note.version, 'base_length': len(self.note.content), 'ops': [[5, 100, 'x']]})
+        self.assertBudget(3, reverse('autosave_note', args=[self.note.id]), 'post', data,
+                          content_type='application/json', status=400)
+
+    def test_autosave_base_mismatch(self):
+        # Same version, but the client's copy isn't the stored text
+        data = json.dumps({'version': self.note.version, 'base_length': len(self.note.content) + 1,
+                           'ops': [[0, 0, 'Mi ']]})
+        response = self.assertBudget(3, reverse('autosave_note', args=[self.note.id]), 'post', data,
+                                     content_type='application/json', status=409)
+        self.assertEqual(response.json()['content'], 'Nota 0')
+
+    def test_multiline(self):
+        # The form posts CRLF; the page and the autosave work on LF text
+        self.client.post(reverse('create_note'), {'content': 'línea uno\r\nlínea dos'})
+        note = Note.objects.get(content__startswith='línea')
+        self.assertEqual(note.content, 'línea uno\nlínea dos')
+
+        end = len(note.content)
+        data = json.dumps({'version': note.version, 'base_length': end, 'ops': [[end, end, '!']]})
+        self.client.post(reverse('autosave_note', args=[note.id]), data, content_type='application/json')
+        note.refresh_from_db()
+        self.assertEqual(note.content, 'línea uno\nlínea dos!')
+
+        self.client.post(reverse('manage_note', args=[note.id]), {'content': 'uno\r\ndos\rtres'})
+        note.refresh_from_db()
+        self.assertEqual(note.content, 'uno\ndos\ntres')
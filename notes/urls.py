@@ -5,4 +5,5 @@ urlpatterns = [
     path('', views.index, name='notes_index'),
     path('manage/', views.manage_note, name='create_note'),
     path('manage/<int:note_id>/', views.manage_note, name='manage_note'),
+    path('<int:note_id>/autosave/', views.autosave_note, name='autosave_note'),
 ]
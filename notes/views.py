@@ -1,12 +1,20 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
+from django.db import transaction
+from django.http import JsonResponse
+from django.utils.text import normalize_newlines
+from django.views.decorators.http import require_POST
 from .models import Note
+from .patches import PatchError, apply_patch
+from core.cache import conditional, fragment_context
 import json
 
 @login_required
+@conditional('notes', vary_csrf=True)
 def index(request):
-    notes = Note.objects.all().order_by('-updated_at')
-    return render(request, 'notes/index.html', {'notes': notes})
+    # Lazy: only evaluated when the cached list fragment has to be re-rendered
+    notes = Note.objects.select_related('user').order_by('-updated_at')
+    return render(request, 'notes/index.html', {'notes': notes, **fragment_context(request, 'notes')})
 
 @login_required
 def manage_note(request, note_id=None):
@@ -16,14 +24,48 @@ def manage_note(request, note_id=None):
             note = get_object_or_404(Note, id=note_id)
             if 'delete' in request.POST:
                 note.delete()
-            else:
-                note.content = request.POST.get('content')
+            elif 'content' in request.POST:
+                # Browsers post textareas with CRLF; autosave offsets count
+                # the LF text the page shows, so only \n is ever stored
+                note.content = normalize_newlines(request.POST['content'])
+                note.version += 1
                 note.save()
         else:
             # Create new note
-            content = request.POST.get('content')
+            content = normalize_newlines(request.POST.get('content', ''))
             if content:
                 Note.objects.create(user=request.user, content=content)
         return redirect('notes_index')
     
     return redirect('notes_index')
+
+@login_required
+@require_POST
+def autosave_note(request, note_id):
+    """Apply a patch (see patches.py) made against ``version`` of the note.
+
+    Answers with the new version, or 409 with the current content and version
+    when someone else saved first; the client rebases its edit and retries.
+    The same happens when the client's copy of that version isn't
+    ``base_length`` characters long, so offsets counted on a different text
+    never land in the wrong place.
+    """
+    try:
+        payload = json.loads(request.body)
+        base_version = int(payload['version'])
+        base_length = int(payload['base_length'])
+        ops = payload['ops']
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'status': 'error'}, status=400)
+
+    with transaction.atomic():
+        note = get_object_or_404(Note.objects.select_for_update(), id=note_id)
+        if note.version != base_version or len(note.content) != base_length:
+            return JsonResponse({'status': 'conflict', 'version': note.version, 'content': note.content}, status=409)
+        try:
+            note.content = normalize_newlines(apply_patch(note.content, ops))
+        except PatchError:
+            return JsonResponse({'status': 'error'}, status=400)
+        note.version += 1
+        note.save(update_fields=['content', 'version', 'updated_at'])
+    return JsonResponse({'status': 'ok', 'version': note.version})
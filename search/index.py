@@ -0,0 +1,109 @@
+import html
+import re
+
+from django.apps import apps
+from django.db import connection
+
+TABLE = 'search_index'
+
+# kind -> (rowid tag, model, title field, body fields)
+# Each indexed row gets rowid = pk * 8 + tag, so updates and deletes hit the
+# FTS table by rowid instead of scanning it.
+SOURCES = {
+    'note': (1, 'notes.Note', None, ['content']),
+    'message': (2, 'chat.Message', None, ['content']),
+    'watchitem': (3, 'watchlist.WatchItem', 'title', ['comment']),
+    'review': (4, 'watchlist.Review', None, ['comment']),
+    'photo': (5, 'gallery.Photo', None, ['description']),
+}
+KIND_BY_MODEL = {model: kind for kind, (_, model, _, _) in SOURCES.items()}
+
+# Control characters can't appear in stored text, so they are safe snippet
+# markers that get swapped for <mark> after HTML-escaping.
+MARK_START, MARK_END = '\x02', '\x03'
+
+
+def is_available():
+    return connection.vendor == 'sqlite'
+
+
+def rowid(kind, pk):
+    return pk * 8 + SOURCES[kind][0]
+
+
+def document(kind, obj):
+    _, _, title_field, body_fields = SOURCES[kind]
+    title = getattr(obj, title_field) if title_field else ''
+    body = '\n'.join(filter(None, (getattr(obj, field) for field in body_fields)))
+    return title or '', body
+
+
+def index_object(kind, obj):
+    title, body = document(kind, obj)
+    with connection.cursor() as cursor:
+        if not (title or body):
+            cursor.execute(f"DELETE FROM {TABLE} WHERE rowid = %s", [rowid(kind, obj.pk)])
+            return
+        cursor.execute(
+            f"INSERT OR REPLACE INTO {TABLE} (rowid, kind, object_id, title, body) VALUES (%s, %s, %s, %s, %s)",
+            [rowid(kind, obj.pk), kind, obj.pk, title, body],
+        )
+
+
+def unindex_object(kind, pk):
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLE} WHERE rowid = %s", [rowid(kind, pk)])
+
+
+def rebuild():
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLE}")
+    for kind, (_, model, _, _) in SOURCES.items():
+        for obj in apps.get_model(model).objects.iterator():
+            index_object(kind, obj)
+    # Archived chat messages stay searchable
+    from chat.archive import archived_messages
+    for msg in archived_messages():
+        index_object('message', msg)
+
+
+def match_expression(query):
+    # Quote every word (so FTS operators in user input are inert) and make
+    # each one a prefix match.
+    words = re.findall(r'\w+', query)
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def search(query, per_kind=10):
+    """Ranked matches for ``query`` grouped by kind.
+
+    Returns {kind: [{'id', 'snippet'}, ...]} with the best matches first and
+    snippets as safe HTML with the matched words wrapped in <mark>.
+    """
+    expression = match_expression(query)
+    if not expression:
+        return {}
+    # One ranked pass over the matches, capped per kind so a busy chat can't
+    # crowd out the other groups. kind is UNINDEXED, so it can't narrow the
+    # MATCH itself. Snippets are only built for the rows kept, by looking
+    # them up again by rowid.
+    sql = f"""
+        WITH ranked AS (
+            SELECT rowid, ROW_NUMBER() OVER (PARTITION BY kind ORDER BY rank) AS position
+            FROM {TABLE}
+            WHERE {TABLE} MATCH %s AND rank MATCH 'bm25(0.0, 0.0, 4.0, 1.0)'
+        )
+        SELECT kind, object_id, snippet({TABLE}, -1, %s, %s, '…', 16)
+        FROM ranked JOIN {TABLE} ON {TABLE}.rowid = ranked.rowid
+        WHERE {TABLE} MATCH %s AND ranked.position <= %s
+        ORDER BY ranked.position
+    """
+    groups = {}
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [expression, MARK_START, MARK_END, expression, per_kind])
+        for kind, object_id, snippet in cursor.fetchall():
+            groups.setdefault(kind, []).append({
+                'id': object_id,
+                'snippet': html.escape(snippet).replace(MARK_START, '<mark>').replace(MARK_END, '</mark>'),
+            })
+    return groups
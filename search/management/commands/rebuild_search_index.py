@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from search import index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index from scratch"
+
+    def handle(self, *args, **options):
+        if not index.is_available():
+            raise CommandError("Full-text search needs the SQLite backend (FTS5)")
+        index.rebuild()
+        self.stdout.write("Search index rebuilt")
@@ -0,0 +1,53 @@
+from django.db import migrations
+
+# FTS5 virtual table holding every searchable text in the app, see search.index
+CREATE_TABLE = """
+    CREATE VIRTUAL TABLE search_index USING fts5(
+        kind UNINDEXED,
+        object_id UNINDEXED,
+        title,
+        body,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+"""
+
+BACKFILL = [
+    "INSERT INTO search_index (rowid, kind, object_id, title, body) "
+    "SELECT id * 8 + 1, 'note', id, '', content FROM notes_note WHERE content != ''",
+    "INSERT INTO search_index (rowid, kind, object_id, title, body) "
+    "SELECT id * 8 + 2, 'message', id, '', content FROM chat_message WHERE content != ''",
+    "INSERT INTO search_index (rowid, kind, object_id, title, body) "
+    "SELECT id * 8 + 3, 'watchitem', id, title, comment FROM watchlist_watchitem",
+    "INSERT INTO search_index (rowid, kind, object_id, title, body) "
+    "SELECT id * 8 + 4, 'review', id, '', comment FROM watchlist_review WHERE comment != ''",
+    "INSERT INTO search_index (rowid, kind, object_id, title, body) "
+    "SELECT id * 8 + 5, 'photo', id, '', description FROM gallery_photo WHERE description != ''",
+]
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(CREATE_TABLE)
+    for statement in BACKFILL:
+        schema_editor.execute(statement)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS search_index")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0002_message_image_alter_message_content'),
+        ('gallery', '0002_photo_description'),
+        ('notes', '0001_initial'),
+        ('watchlist', '0003_review'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,23 @@
+from django.db.models.signals import post_save, post_delete
+
+from . import index
+
+
+def _kind(sender):
+    return index.KIND_BY_MODEL[sender._meta.label]
+
+
+def update_index(sender, instance, **kwargs):
+    if index.is_available():
+        index.index_object(_kind(sender), instance)
+
+
+def remove_from_index(sender, instance, **kwargs):
+    if index.is_available():
+        index.unindex_object(_kind(sender), instance.pk)
+
+
+def connect():
+    for model in index.KIND_BY_MODEL:
+        post_save.connect(update_index, sender=model, dispatch_uid=f'search-save-{model}')
+        post_delete.connect(remove_from_index, sender=model, dispatch_uid=f'search-delete-{model}')
@@ -0,0 +1,83 @@
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from chat.models import Message
+from core.testing import SpaceFixtureMixin
+from notes.models import Note
+from watchlist.models import WatchItem
+
+from . import index
+
+
+@skipUnless(connection.vendor == 'sqlite', "The index is an SQLite FTS5 table")
+class SearchTests(SpaceFixtureMixin, TestCase):
+    @classmethod
+    def seed(cls):
+        # Created through the ORM, so the signals index them
+        cls.note = Note.objects.create(user=cls.user, content="Receta de la canción <b>favorita</b>")
+        cls.item = WatchItem.objects.create(title="Película de terror", comment="Para octubre", added_by=cls.user)
+        for i in range(15):
+            Message.objects.create(user=cls.other, content=f"Hola número {i}")
+
+    def ids(self, query, kind):
+        return [hit['id'] for hit in index.search(query).get(kind, [])]
+
+    def test_view(self):
+        response = self.client.get(reverse('search'), {'q': 'receta'})
+        self.assertContains(response, 'Notas')
+        self.assertContains(response, '<mark>Receta</mark>')
+
+    def test_view_json(self):
+        response = self.client.get(reverse('search'), {'q': 'pelicula', 'format': 'json'})
+        groups = response.json()['groups']
+        self.assertEqual([group['kind'] for group in groups], ['watchitem'])
+        self.assertEqual(groups[0]['results'][0]['url'], reverse('watchlist_index'))
+
+    def test_view_login_required(self):
+        response = Client().get(reverse('search'), {'q': 'receta'})
+        self.assertEqual(response.status_code, 302)
+
+    def test_snippet_escaped(self):
+        snippet = index.search('favorita')['note'][0]['snippet']
+        self.assertIn('&lt;b&gt;<mark>favorita</mark>&lt;/b&gt;', snippet)
+
+    def test_prefix(self):
+        self.assertEqual(self.ids('pel', 'watchitem'), [self.item.id])
+        self.assertEqual(self.ids('rece fav', 'note'), [self.note.id])
+
+    def test_diacritics(self):
+        self.assertEqual(self.ids('pelicula', 'watchitem'), [self.item.id])
+        self.assertEqual(self.ids('CANCION', 'note'), [self.note.id])
+        self.assertEqual(self.ids('canción', 'note'), [self.note.id])
+
+    def test_operators_escaped(self):
+        # FTS5 syntax in the query is searched for as words, never parsed
+        for query in ['receta OR nada', 'NEAR(receta', 'receta"', 'title:receta', '*receta -nada^']:
+            with self.subTest(query=query):
+                index.search(query)
+        self.assertEqual(self.ids('receta"', 'note'), [self.note.id])
+        self.assertEqual(self.ids('receta OR nada', 'note'), [])
+        self.assertEqual(index.search('"*'), {})
+
+    def test_per_kind_limit(self):
+        results = index.search('hola', per_kind=10)
+        self.assertEqual(len(results['message']), 10)
+        # Capping the chat doesn't crowd out the other kinds
+        Note.objects.create(user=self.user, content="Hola a todos")
+        results = index.search('hola', per_kind=10)
+        self.assertEqual((len(results['message']), len(results['note'])), (10, 1))
+
+    def test_sync_on_save(self):
+        self.note.content = "Lista de compras"
+        self.note.save()
+        self.assertEqual(self.ids('compras', 'note'), [self.note.id])
+        self.assertEqual(self.ids('receta', 'note'), [])
+
+    def test_sync_on_delete(self):
+        self.item.delete()
+        self.assertEqual(self.ids('terror', 'watchitem'), [])
+        Message.objects.filter(content__startswith="Hola").delete()
+        self.assertNotIn('message', index.search('hola'))
@@ -0,0 +1,30 @@
+from django.shortcuts import render
+from django.http import JsonResponse
+from django.contrib.auth.decorators import login_required
+from django.urls import reverse
+from . import index
+
+# kind -> (group title, link to where the result lives)
+GROUPS = {
+    'note': ('Notas', lambda pk: reverse('notes_index')),
+    'message': ('Chat', lambda pk: reverse('home')),
+    'watchitem': ('Para Ver', lambda pk: reverse('watchlist_index')),
+    'review': ('Opiniones', lambda pk: reverse('watchlist_index')),
+    'photo': ('Fotos', lambda pk: reverse('photo_detail', args=[pk])),
+}
+
+@login_required
+def search(request):
+    query = request.GET.get('q', '').strip()
+    results = index.search(query) if query and index.is_available() else {}
+
+    groups = []
+    for kind, (title, link) in GROUPS.items():
+        if kind in results:
+            for hit in results[kind]:
+                hit['url'] = link(hit['id'])
+            groups.append({'kind': kind, 'title': title, 'results': results[kind]})
+
+    if request.GET.get('format') == 'json':
+        return JsonResponse({'query': query, 'groups': groups})
+    return render(request, 'search/results.html', {'query': query, 'groups': groups})
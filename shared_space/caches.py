@@ -0,0 +1,39 @@
+"""Cache settings.
+
+``cache_config()`` builds ``CACHES['default']`` from ``CACHE_BACKEND``:
+
+``file`` (default)
+    Files under ``CACHE_LOCATION`` (default ``<BASE_DIR>/cache``), shared by
+    every process on the machine.
+``locmem``
+    Per-process memory. Only for a single web process: a session logged out
+    or a user changed in one process stays cached in the others until the
+    entry expires. gunicorn.conf.py refuses it with more than one worker.
+``db``
+    The ``cache_table`` table of the default database, shared by every
+    process. Run ``manage.py createcachetable`` once before using it.
+"""
+import os
+
+BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'db': 'django.core.cache.backends.db.DatabaseCache',
+}
+
+
+def cache_config(base_dir):
+    backend = os.environ.get('CACHE_BACKEND', 'file')
+    try:
+        config = {'BACKEND': BACKENDS[backend]}
+    except KeyError:
+        raise ValueError(f"Unsupported CACHE_BACKEND: {backend!r}")
+
+    if backend == 'file':
+        config['LOCATION'] = os.environ.get('CACHE_LOCATION', str(base_dir / 'cache'))
+    elif backend == 'db':
+        config['LOCATION'] = os.environ.get('CACHE_LOCATION', 'cache_table')
+    else:
+        config['LOCATION'] = 'shared-space'
+    config['OPTIONS'] = {'MAX_ENTRIES': int(os.environ.get('CACHE_MAX_ENTRIES', 5000))}
+    return config
@@ -10,8 +10,12 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from .caches import cache_config
+from .db import database_config
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -41,6 +45,8 @@ INSTALLED_APPS = [
     'watchlist',
     'notes',
     'chat',
+    'jobs',
+    'search',
 ]
 
 MIDDLEWARE = [
@@ -49,11 +55,18 @@ MIDDLEWARE = [
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.CachedAuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Per-view latency, SQL and template timings (Server-Timing header and the
+# staff-only /metrics/ page). Off unless METRICS_ENABLED=1, in which case the
+# middleware wraps everything else.
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED') == '1'
+if METRICS_ENABLED:
+    MIDDLEWARE.insert(0, 'core.middleware.MetricsMiddleware')
+
 ROOT_URLCONF = 'shared_space.urls'
 
 TEMPLATES = [
@@ -77,14 +90,25 @@ WSGI_APPLICATION = 'shared_space.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
+# SQLite with WAL/busy-timeout pragmas and persistent connections, or
+# DATABASE_URL for a server database (see shared_space/db.py)
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': database_config(BASE_DIR),
 }
 
 
+# Cache: files shared by every process by default, CACHE_BACKEND=db/locmem
+# for the others (see shared_space/caches.py)
+CACHES = {
+    'default': cache_config(BASE_DIR),
+}
+
+# Sessions and the logged-in user are read from the cache and only briefly
+# trusted there (core/sessions.py, core/auth.py), so most requests don't
+# touch django_session or auth_user at all.
+SESSION_ENGINE = 'core.sessions'
+
+
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 
@@ -123,4 +147,15 @@ STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
-
+# Internal nginx location aliased to MEDIA_ROOT (e.g. /_media/). When set,
+# media responses carry X-Accel-Redirect and nginx sends the file itself.
+MEDIA_ACCEL_REDIRECT = os.environ.get('MEDIA_ACCEL_REDIRECT') or None
+
+# Chat messages older than CHAT_ARCHIVE_AFTER_DAYS are moved into compressed
+# segments under CHAT_ARCHIVE_DIR by `manage.py archive_chat` (chat/archive.py).
+CHAT_ARCHIVE_DIR = os.environ.get('CHAT_ARCHIVE_DIR', str(BASE_DIR / 'archive' / 'chat'))
+CHAT_ARCHIVE_AFTER_DAYS = int(os.environ.get('CHAT_ARCHIVE_AFTER_DAYS', 180))
+
+# Image uploads (gallery, chat) are streamed to MEDIA_ROOT, hashed and
+# checked as they arrive, and refused past this size (core/uploadhandlers.py).
+IMAGE_UPLOAD_MAX_SIZE = int(os.environ.get('IMAGE_UPLOAD_MAX_SIZE', 20 * 1024 * 1024))
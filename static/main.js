@@ -20,6 +20,65 @@ function getCookie(name) {
 
 const csrftoken = getCookie('csrftoken');
 
+// Resumable uploads: the file goes up in chunks, and after a failed chunk the
+// upload carries on from the last byte the server has instead of restarting.
+// Resolves to the upload id, which forms then send instead of the file.
+const UPLOAD_MAX_RETRIES = 6;
+
+async function uploadOffset(uploadId, fallback) {
+    try {
+        const res = await fetch(`/uploads/${uploadId}/`);
+        if (res.ok) return (await res.json()).offset;
+    } catch (err) {
+        // Still offline, retry the chunk from where we were
+    }
+    return fallback;
+}
+
+async function uploadResumable(file, onProgress) {
+    const startRes = await fetch('/uploads/', {
+        method: 'POST',
+        headers: { 'X-CSRFToken': csrftoken },
+        body: new URLSearchParams({ filename: file.name, size: file.size })
+    });
+    const upload = await startRes.json();
+    if (!startRes.ok) throw new Error(upload.error || 'Error al subir la imagen');
+
+    let offset = 0;
+    let failures = 0;
+    while (offset < file.size) {
+        let res = null;
+        try {
+            res = await fetch(`/uploads/${upload.id}/?offset=${offset}`, {
+                method: 'POST',
+                headers: { 'X-CSRFToken': csrftoken, 'Content-Type': 'application/octet-stream' },
+                body: file.slice(offset, offset + upload.chunk_size)
+            });
+        } catch (err) {
+            res = null; // Network error
+        }
+
+        if (!res || res.status >= 500) {
+            if (++failures > UPLOAD_MAX_RETRIES) throw new Error('Error de conexión al subir la imagen');
+            await new Promise(resolve => setTimeout(resolve, 1000 * 2 ** (failures - 1)));
+            offset = await uploadOffset(upload.id, offset);
+            continue;
+        }
+
+        const data = await res.json();
+        if (res.status === 409) {
+            // The server already has more (or less) than we thought
+            offset = data.offset;
+            continue;
+        }
+        if (!res.ok) throw new Error(data.error || 'Error al subir la imagen');
+        offset = data.offset;
+        failures = 0;
+        if (onProgress) onProgress(offset / file.size);
+    }
+    return upload.id;
+}
+
 document.addEventListener("DOMContentLoaded", () => {
     // Reveal animations
     const observer = new IntersectionObserver((entries) => {
@@ -36,6 +95,9 @@ document.addEventListener("DOMContentLoaded", () => {
 
     // Chat Logic
     initChat();
+
+    // Gallery infinite scroll
+    initGallery();
 });
 
 function initChat() {
@@ -106,35 +168,35 @@ function initChat() {
         }
     }
 
+    function buildDateHeader(dateStr) {
+        const div = document.createElement('div');
+        div.className = 'chat-date-header';
+        div.innerText = dateStr;
+        return div;
+    }
+
     function addDateHeader(isoString) {
         const dateStr = formatDate(isoString);
         if (dateStr !== lastDateString) {
-            const div = document.createElement('div');
-            div.className = 'chat-date-header';
-            div.innerText = dateStr;
-            chatMessages.appendChild(div);
+            chatMessages.appendChild(buildDateHeader(dateStr));
             lastDateString = dateStr;
         }
     }
 
-    function addMessage(msg, isUser, isOptimistic = false) {
-        // Validation: If we already have this ID, skip it (unless it's optimistic update)
-        if (msg.id && seenMessageIds.has(msg.id)) return;
-
-        // If it's a real message, track it
-        if (msg.id) seenMessageIds.add(msg.id);
-
-        // Check for date header if timestamp exists
-        if (msg.timestamp) {
-            addDateHeader(msg.timestamp);
-        }
-
+    function buildMessageElement(msg, isUser, isOptimistic = false) {
         const div = document.createElement('div');
         div.className = `message ${isUser ? 'user' : 'bot'} ${isOptimistic ? 'optimistic' : ''}`;
 
         let content = '';
         if (msg.image_url) {
-            content += `<img src="${msg.image_url}" class="chat-image" onclick="window.open(this.src, '_blank')">`;
+            const variants = msg.image_variants;
+            if (variants) {
+                // Small bubble: let the browser pick a resized copy, open the original on click
+                const srcset = variants.srcset ? ` srcset="${variants.srcset}" sizes="180px"` : '';
+                content += `<img src="${variants.thumb}"${srcset} class="chat-image" onclick="window.open('${msg.image_url}', '_blank')">`;
+            } else {
+                content += `<img src="${msg.image_url}" class="chat-image" onclick="window.open(this.src, '_blank')">`;
+            }
         }
         if (msg.content || msg.text) {
             content += `<p>${msg.content || msg.text}</p>`;
@@ -145,39 +207,160 @@ function initChat() {
         content += `<span class="message-time">${timeStr}</span>`;
 
         div.innerHTML = content;
-        chatMessages.appendChild(div);
+        return div;
     }
 
-    async function fetchMessages() {
+    function addMessage(msg, isUser, isOptimistic = false) {
+        // Validation: If we already have this ID, skip it (unless it's optimistic update)
+        if (msg.id && seenMessageIds.has(msg.id)) return;
+
+        // If it's a real message, track it
+        if (msg.id) seenMessageIds.add(msg.id);
+
+        // Check for date header if timestamp exists
+        if (msg.timestamp) {
+            addDateHeader(msg.timestamp);
+        }
+
+        chatMessages.appendChild(buildMessageElement(msg, isUser, isOptimistic));
+    }
+
+    // History: older pages are loaded on demand as the user scrolls up
+    let oldestMessageId = null;
+    let hasMoreHistory = false;
+    let historyLoading = false;
+
+    async function loadOlderMessages() {
+        if (historyLoading || !hasMoreHistory || oldestMessageId === null) return;
+        historyLoading = true;
         try {
-            const res = await fetch('/chat/get/');
+            const res = await fetch(`/chat/get/?before=${oldestMessageId}&limit=50`);
             const data = await res.json();
+            hasMoreHistory = data.has_more;
+
+            const older = data.messages.filter(msg => !seenMessageIds.has(msg.id));
+            if (older.length === 0) return;
+            oldestMessageId = older[0].id;
+
+            const fragment = document.createDocumentFragment();
+            let pageDate = null;
+            older.forEach(msg => {
+                seenMessageIds.add(msg.id);
+                const dateStr = formatDate(msg.timestamp);
+                if (dateStr !== pageDate) {
+                    fragment.appendChild(buildDateHeader(dateStr));
+                    pageDate = dateStr;
+                }
+                fragment.appendChild(buildMessageElement(msg, msg.is_user));
+            });
 
-            // Filter only NEW messages
-            const newMessages = data.messages.filter(msg => !seenMessageIds.has(msg.id));
+            const previousHeight = chatMessages.scrollHeight;
 
-            if (newMessages.length === 0) return; // Nothing to do, zero flicker.
+            // The page runs into the first day already shown: drop the duplicate header
+            const firstChild = chatMessages.firstElementChild;
+            if (firstChild && firstChild.classList.contains('chat-date-header') && firstChild.innerText === pageDate) {
+                firstChild.remove();
+            }
+            chatMessages.insertBefore(fragment, chatMessages.firstChild);
 
-            const wasNearBottom = isUserNearBottom();
+            // Keep the viewport on the message the user was reading
+            chatMessages.scrollTop += chatMessages.scrollHeight - previousHeight;
+        } catch (err) {
+            console.error("Error loading history:", err);
+        } finally {
+            historyLoading = false;
+        }
+    }
 
-            // If we have new messages, remove optimistic ones to prevent duplication
-            // (Only if we assume the new messages cover the optimistic ones)
-            if (newMessages.length > 0) {
-                document.querySelectorAll('.message.optimistic').forEach(el => el.remove());
-            }
+    chatMessages.addEventListener('scroll', () => {
+        if (chatMessages.scrollTop < 80) loadOlderMessages();
+    });
 
-            newMessages.forEach(msg => {
-                addMessage(msg, msg.is_user);
-            });
+    let lastMessageId = null;
+    let fetchInFlight = false;
+    let fetchQueued = false;
+    let messageStream = null;
+    let pollTimer = null;
 
-            // Scroll logic: If was near bottom OR first load (empty chat)
-            if (wasNearBottom || chatMessages.childElementCount <= newMessages.length + 5) { // broad check for "start"
-                scrollToBottom();
+    function renderNewMessages(messages) {
+        if (messages.length > 0) {
+            lastMessageId = Math.max(lastMessageId || 0, ...messages.map(msg => msg.id));
+        }
+
+        // Filter only NEW messages
+        const newMessages = messages.filter(msg => !seenMessageIds.has(msg.id));
+        if (newMessages.length === 0) return;
+
+        const wasNearBottom = isUserNearBottom();
+
+        // If we have new messages, remove optimistic ones to prevent duplication
+        // (Only if we assume the new messages cover the optimistic ones)
+        document.querySelectorAll('.message.optimistic').forEach(el => el.remove());
+
+        newMessages.forEach(msg => {
+            addMessage(msg, msg.is_user);
+        });
+
+        // Scroll logic: If was near bottom OR first load (empty chat)
+        if (wasNearBottom || chatMessages.childElementCount <= newMessages.length + 5) { // broad check for "start"
+            scrollToBottom();
+        }
+    }
+
+    async function fetchMessages() {
+        if (fetchInFlight) {
+            fetchQueued = true;
+            return;
+        }
+        fetchInFlight = true;
+        try {
+            // Ask only for messages newer than the last one we have
+            const url = lastMessageId === null ? '/chat/get/' : `/chat/get/?since=${lastMessageId}`;
+            const res = await fetch(url);
+            if (res.status === 204) return; // Nothing new, zero flicker.
+            const isInitialLoad = lastMessageId === null;
+            const data = await res.json();
+
+            if (isInitialLoad && data.messages.length > 0) {
+                oldestMessageId = data.messages[0].id;
+                hasMoreHistory = data.has_more;
             }
 
+            renderNewMessages(data.messages);
+
+            // A full page means we were far behind, keep catching up
+            if (data.messages.length >= 50) fetchQueued = true;
+
         } catch (err) {
             console.error("Error fetching messages:", err);
+        } finally {
+            fetchInFlight = false;
+            if (fetchQueued) {
+                fetchQueued = false;
+                fetchMessages();
+            }
+        }
+    }
+
+    function startPolling() {
+        if (!pollTimer) pollTimer = setInterval(fetchMessages, 3000); // Polling every 3s
+    }
+
+    // Push path: the server streams new messages as Server-Sent Events.
+    // Falls back to polling if the stream can't be kept open.
+    function startStream() {
+        if (!window.EventSource) {
+            startPolling();
+            return;
         }
+        messageStream = new EventSource(`/chat/stream/?since=${lastMessageId || 0}`);
+        messageStream.onmessage = (e) => renderNewMessages([JSON.parse(e.data)]);
+        messageStream.onerror = () => {
+            if (messageStream.readyState === EventSource.CLOSED) {
+                messageStream = null;
+                startPolling();
+            }
+        };
     }
 
     async function sendMessage() {
@@ -188,7 +371,6 @@ function initChat() {
 
         const formData = new FormData();
         if (text) formData.append('content', text);
-        if (file) formData.append('image', file);
 
         // Optimistic UI
         const nowIso = new Date().toISOString();
@@ -206,13 +388,15 @@ function initChat() {
         clearImage();
 
         try {
+            // The image goes up first, the message then refers to the upload
+            if (file) formData.append('upload_id', await uploadResumable(file));
             await fetch('/chat/send/', {
                 method: 'POST',
                 headers: { 'X-CSRFToken': csrftoken },
                 body: formData
             });
-            // Fetch immediately to replace optimistic with real
-            fetchMessages();
+            // Fetch immediately to replace optimistic with real (the stream delivers it on its own)
+            if (!messageStream) fetchMessages();
         } catch (err) {
             console.error("Error sending message:", err);
         }
@@ -236,11 +420,79 @@ function initChat() {
         }
     });
 
-    // Initial load and polling
-    fetchMessages();
-    setInterval(fetchMessages, 3000); // Polling every 3s
+    // Initial load, then live updates
+    fetchMessages().then(startStream);
+}
+
+// ==========================================
+// 2. Gallery Infinite Scroll
+// ==========================================
+
+function initGallery() {
+    const grid = document.getElementById('photo-grid');
+    const sentinel = document.getElementById('photo-grid-sentinel');
+    if (!grid || !sentinel) return;
+
+    let nextCursor = grid.dataset.nextCursor;
+    let loading = false;
+
+    async function loadMorePhotos() {
+        if (loading || !nextCursor) return;
+        loading = true;
+        try {
+            const res = await fetch(`/gallery/page/?cursor=${encodeURIComponent(nextCursor)}`);
+            const data = await res.json();
+            grid.insertAdjacentHTML('beforeend', data.html);
+            nextCursor = data.next_cursor;
+            // Re-observe so a sentinel that is still on screen triggers the next page
+            pageObserver.unobserve(sentinel);
+            if (nextCursor) pageObserver.observe(sentinel);
+        } catch (err) {
+            console.error("Error loading photos:", err);
+        } finally {
+            loading = false;
+        }
+    }
+
+    // Start fetching a bit before the user reaches the end of the grid
+    const pageObserver = new IntersectionObserver((entries) => {
+        if (entries.some(entry => entry.isIntersecting)) loadMorePhotos();
+    }, { rootMargin: '600px 0px' });
+
+    if (nextCursor) pageObserver.observe(sentinel);
+}
+
+// Gallery file picker: resumable upload, then add the photo and reload
+async function uploadPhoto(input) {
+    const file = input.files[0];
+    if (!file) return;
+    const label = input.form.querySelector('label');
+    const labelText = label ? label.textContent : '';
+
+    try {
+        const uploadId = await uploadResumable(file, (done) => {
+            if (label) label.textContent = `Subiendo ${Math.round(done * 100)}%`;
+        });
+        const body = new FormData();
+        body.append('upload_id', uploadId);
+        const res = await fetch(input.form.action, {
+            method: 'POST',
+            headers: { 'X-CSRFToken': csrftoken, 'Accept': 'application/json' },
+            body: body,
+            redirect: 'manual'
+        });
+        if (res.status >= 400) throw new Error((await res.json()).error || 'Error al subir la imagen');
+        window.location.reload();
+    } catch (err) {
+        console.error("Error uploading photo:", err);
+        alert(err.message);
+        if (label) label.textContent = labelText;
+        input.value = '';
+    }
 }
 
+window.uploadPhoto = uploadPhoto;
+
 // ==========================================
 // 3. Mood Background Logic
 // ==========================================
@@ -338,14 +590,13 @@ const moodReverseMap = {
     'angry': 0, 'sad': 1, 'tired': 2, 'calm': 3, 'happy': 4, 'love': 5
 };
 
-const moodSvgs = {
-    0: `<svg viewBox="0 0 36 36" fill="url(#grad_angry)"><defs><linearGradient id="grad_angry" x1="0%" y1="0%" x2="100%" y2="100%"><stop offset="0%" style="stop-color:#FF5E62;stop-opacity:1" /><stop offset="100%" style="stop-color:#FF9966;stop-opacity:1" /></linearGradient></defs><circle cx="18" cy="18" r="18"/><path fill="#FFF" d="M11 23c0-2.5 7-2.5 14 0M10 14l5 2M26 14l-5 2" stroke="#FFF" stroke-width="2" stroke-linecap="round"/></svg>`, // Angry
-    1: `<svg viewBox="0 0 36 36" fill="url(#grad_sad)"><defs><linearGradient id="grad_sad" x1="0%" y1="0%" x2="100%" y2="100%"><stop offset="0%" style="stop-color:#5B86E5;stop-opacity:1" /><stop offset="100%" style="stop-color:#36D1DC;stop-opacity:1" /></linearGradient></defs><circle cx="18" cy="18" r="18"/><circle fill="#FFF" cx="12" cy="14" r="2"/><circle fill="#FFF" cx="24" cy="14" r="2"/><path fill="none" stroke="#FFF" stroke-width="2" stroke-linecap="round" d="M12 25s3-2 6-2 6 2 6 2"/><path fill="#FFF" d="M25 15c.5 2 1 4 0 5" opacity="0.5"/></svg>`, // Sad
-    2: `<svg viewBox="0 0 36 36" fill="url(#grad_tired)"><defs><linearGradient id="grad_tired" x1="0%" y1="0%" x2="100%" y2="100%"><stop offset="0%" style="stop-color:#bdc3c7;stop-opacity:1" /><stop offset="100%" style="stop-color:#2c3e50;stop-opacity:1" /></linearGradient></defs><circle cx="18" cy="18" r="18"/><path fill="none" stroke="#FFF" stroke-width="2" d="M10 16h6M20 16h6"/><circle fill="#FFF" cx="28" cy="12" r="3" opacity="0.5"/><circle fill="#FFF" cx="32" cy="8" r="1.5" opacity="0.5"/><path fill="none" stroke="#FFF" stroke-width="2" d="M14 24s2 2 4 2 4-2 4-2"/></svg>`, // Tired
-    3: `<svg viewBox="0 0 36 36" fill="url(#grad_calm)"><defs><linearGradient id="grad_calm" x1="0%" y1="0%" x2="100%" y2="100%"><stop offset="0%" style="stop-color:#89f7fe;stop-opacity:1" /><stop offset="100%" style="stop-color:#66a6ff;stop-opacity:1" /></linearGradient></defs><circle cx="18" cy="18" r="18"/><circle fill="#FFF" cx="12" cy="15" r="2"/><circle fill="#FFF" cx="24" cy="15" r="2"/><path fill="none" stroke="#FFF" stroke-width="2" d="M13 22s2.5 2 5 2 5-2 5-2"/></svg>`, // Calm
-    4: `<svg viewBox="0 0 36 36" fill="url(#grad_happy)"><defs><linearGradient id="grad_happy" x1="0%" y1="0%" x2="100%" y2="100%"><stop offset="0%" style="stop-color:#F2994A;stop-opacity:1" /><stop offset="100%" style="stop-color:#F2C94C;stop-opacity:1" /></linearGradient></defs><circle cx="18" cy="18" r="18"/><path fill="none" stroke="#FFF" stroke-width="2" stroke-linecap="round" d="M12 22s2.5 3 6 3 6-3 6-3"/><circle fill="#FFF" cx="12" cy="14" r="2"/><circle fill="#FFF" cx="24" cy="14" r="2"/></svg>`, // Happy
-    5: `<svg viewBox="0 0 36 36" fill="url(#grad_love)"><defs><linearGradient id="grad_love" x1="0%" y1="0%" x2="100%" y2="100%"><stop offset="0%" style="stop-color:#ff9a9e;stop-opacity:1" /><stop offset="100%" style="stop-color:#fecfef;stop-opacity:1" /></linearGradient></defs><circle cx="18" cy="18" r="18"/><path fill="#FFF" d="M18 25s-7-4-9-9c-2-5 3-8 6-5 1 1 3 4 3 4s2-3 3-4c3-3 8 0 6 5-2 5-9 9-9 9z"/></svg>` // Love
-};
+// Icons live in the static SVG sprite (static/moods.svg), same as the server-rendered ones
+const moodIconKeys = ['angry', 'sad', 'tired', 'calm', 'happy', 'love'];
+const moodSpriteUrl = document.body.dataset.moodSprite;
+
+function moodIcon(index) {
+    return `<svg viewBox="0 0 36 36" class="mood-icon"><use href="${moodSpriteUrl}#mood-${moodIconKeys[index]}"></use></svg>`;
+}
 
 if (moodSlider) {
     const track = document.getElementById('mood-icons-track');
@@ -356,7 +607,7 @@ if (moodSlider) {
         for (let i = 0; i <= 5; i++) {
             const wrapper = document.createElement('div');
             wrapper.className = 'mood-icon-wrapper';
-            wrapper.innerHTML = moodSvgs[i];
+            wrapper.innerHTML = moodIcon(i);
             track.appendChild(wrapper);
         }
     }
@@ -456,11 +707,125 @@ window.toggleWatchForm = function () {
     }
 };
 
+// Notes are edited in the modal and autosaved as one splice against the
+// version the edit started from (see notes/patches.py). Offsets count code
+// points, like Python strings, so emoji don't shift them.
+const NOTE_SAVE_DELAY = 800;
+let noteEdit = null;
+
+function diffSplice(base, text) {
+    const a = Array.from(base);
+    const b = Array.from(text);
+    let start = 0;
+    while (start < a.length && start < b.length && a[start] === b[start]) start++;
+    let endA = a.length;
+    let endB = b.length;
+    while (endA > start && endB > start && a[endA - 1] === b[endB - 1]) {
+        endA--;
+        endB--;
+    }
+    return [start, endA, b.slice(start, endB).join('')];
+}
+
+function applySplice(text, [start, end, insert]) {
+    const chars = Array.from(text);
+    return chars.slice(0, start).join('') + insert + chars.slice(end).join('');
+}
+
+function rebaseNote(base, local, server) {
+    // Replay our edit on top of the text someone else saved. Edits to
+    // different parts of the note both survive; if they overlap, ours wins.
+    const mine = diffSplice(base, local);
+    const theirs = diffSplice(base, server);
+    if (mine[1] <= theirs[0]) {
+        return applySplice(server, mine);
+    }
+    if (mine[0] >= theirs[1]) {
+        const shift = Array.from(theirs[2]).length - (theirs[1] - theirs[0]);
+        return applySplice(server, [mine[0] + shift, mine[1] + shift, mine[2]]);
+    }
+    return local;
+}
+
+function setNoteStatus(text) {
+    const status = document.getElementById('note-save-status');
+    if (status) status.innerText = text;
+}
+
+function updateNoteCard(edit) {
+    edit.card.querySelector('p').textContent = edit.base;
+    edit.card.dataset.version = edit.version;
+}
+
+// The edited text: the textarea while the modal is open, a snapshot after
+function noteText(edit) {
+    return edit.closed ? edit.closedText : edit.textarea.value;
+}
+
+function setNoteText(edit, text) {
+    if (edit.closed) {
+        edit.closedText = text;
+    } else if (text !== edit.textarea.value) {
+        edit.textarea.value = text;
+    }
+}
+
+async function saveNote(edit = noteEdit) {
+    if (!edit || edit.saving) return;
+    clearTimeout(edit.timer);
+    const text = noteText(edit);
+    if (text === edit.base) return;
+
+    edit.saving = true;
+    if (!edit.closed) setNoteStatus('Guardando...');
+    try {
+        const response = await fetch(edit.url, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json', 'X-CSRFToken': csrftoken },
+            body: JSON.stringify({
+                version: edit.version,
+                base_length: Array.from(edit.base).length,
+                ops: [diffSplice(edit.base, text)],
+            }),
+        });
+        const data = await response.json();
+        if (response.ok) {
+            edit.base = text;
+            edit.version = data.version;
+            if (!edit.closed) setNoteStatus('Guardado');
+        } else if (response.status === 409) {
+            // Someone else saved first: rebase onto their text and retry
+            setNoteText(edit, rebaseNote(edit.base, noteText(edit), data.content));
+            edit.base = data.content;
+            edit.version = data.version;
+        } else {
+            if (!edit.closed) setNoteStatus('No se pudo guardar');
+            return;
+        }
+        updateNoteCard(edit);
+    } catch (error) {
+        if (!edit.closed) setNoteStatus('Sin conexión, reintentando...');
+    } finally {
+        edit.saving = false;
+    }
+    if (noteText(edit) !== edit.base) {
+        scheduleNoteSave(edit);
+    }
+}
+
+function scheduleNoteSave(edit = noteEdit) {
+    if (!edit) return;
+    clearTimeout(edit.timer);
+    edit.timer = setTimeout(() => saveNote(edit), NOTE_SAVE_DELAY);
+}
+window.scheduleNoteSave = () => scheduleNoteSave();
+
 window.openNoteModal = function (el, event) {
     if (event && (event.target.closest('.delete-btn-text') || event.target.closest('form'))) {
         return;
     }
-    const content = el.querySelector('p').innerText;
+    // textContent: the note as stored, without the card's line clamping
+    const content = el.querySelector('p').textContent;
     const meta = el.querySelector('.note-meta').innerText;
 
     const modal = document.getElementById('note-modal');
@@ -468,8 +833,20 @@ window.openNoteModal = function (el, event) {
     const modalMeta = document.getElementById('modal-meta');
 
     if (modal && modalContent) {
-        modalContent.innerText = content;
+        modalContent.value = content;
         modalMeta.innerText = meta;
+        setNoteStatus('');
+        noteEdit = {
+            card: el,
+            textarea: modalContent,
+            url: el.dataset.autosaveUrl,
+            version: parseInt(el.dataset.version, 10),
+            base: content,
+            timer: null,
+            saving: false,
+            closed: false,
+            closedText: '',
+        };
         modal.classList.add('active');
         document.body.style.overflow = 'hidden'; // Prevent scroll
     }
@@ -478,6 +855,13 @@ window.openNoteModal = function (el, event) {
 window.closeNoteModal = function () {
     const modal = document.getElementById('note-modal');
     if (modal) {
+        if (noteEdit) {
+            // Keep saving what was typed, now rather than after the delay
+            noteEdit.closedText = noteEdit.textarea.value;
+            noteEdit.closed = true;
+            saveNote(noteEdit);
+            noteEdit = null;
+        }
         modal.classList.remove('active');
         document.body.style.overflow = '';
     }
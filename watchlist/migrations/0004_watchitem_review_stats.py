@@ -0,0 +1,34 @@
+# Generated by Django 6.0.2 on 2026-10-18 17:48
+
+from django.db import migrations, models
+from django.db.models import Avg, Count
+
+
+def backfill_review_stats(apps, schema_editor):
+    WatchItem = apps.get_model('watchlist', 'WatchItem')
+    items = WatchItem.objects.annotate(count=Count('reviews'), avg=Avg('reviews__rating'))
+    for item in items:
+        item.review_count = item.count
+        item.avg_rating = item.avg or 0
+        item.save(update_fields=['review_count', 'avg_rating'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('watchlist', '0003_review'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='watchitem',
+            name='avg_rating',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='watchitem',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_review_stats, migrations.RunPython.noop),
+    ]
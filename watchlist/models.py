@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import Avg, Count
 from django.contrib.auth.models import User
 
 class WatchItem(models.Model):
@@ -14,10 +15,19 @@ class WatchItem(models.Model):
     is_watched = models.BooleanField(default=False)
     added_by = models.ForeignKey(User, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Denormalized from Review, kept in sync by refresh_review_stats()
+    review_count = models.PositiveIntegerField(default=0)
+    avg_rating = models.FloatField(default=0)
     
     def __str__(self):
         return self.title
 
+    def refresh_review_stats(self):
+        stats = self.reviews.aggregate(count=Count('id'), avg=Avg('rating'))
+        self.review_count = stats['count']
+        self.avg_rating = stats['avg'] or 0
+        self.save(update_fields=['review_count', 'avg_rating'])
+
 class Review(models.Model):
     watch_item = models.ForeignKey(WatchItem, related_name='reviews', on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
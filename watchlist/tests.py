@@ -1,3 +1,48 @@
-from django.test import TestCase
+from django.urls import reverse
 
-# Create your tests here.
+from core.testing import QueryBudgetTestCase, SEED_WATCH_ITEMS, SEED_REVIEWS_PER_ITEM
+from .models import WatchItem, Review
+
+
+class WatchlistQueryBudgetTests(QueryBudgetTestCase):
+    @classmethod
+    def seed(cls):
+        WatchItem.objects.bulk_create(
+            WatchItem(title=f"Peli {i}", added_by=cls.user, is_watched=i % 3 == 0)
+            for i in range(SEED_WATCH_ITEMS)
+        )
+        reviewers = [cls.user, cls.other]
+        Review.objects.bulk_create(
+            Review(watch_item=item, user=reviewers[n], rating=n + 3, comment="Buena")
+            for item in WatchItem.objects.all()
+            for n in range(SEED_REVIEWS_PER_ITEM)
+        )
+        for item in WatchItem.objects.all():
+            item.refresh_review_stats()
+        cls.item = WatchItem.objects.first()
+
+    def test_index(self):
+        # Items plus one prefetch for every review and its author
+        self.assertBudget(3, reverse('watchlist_index'))
+
+    def test_index_by_rating(self):
+        self.assertBudget(3, reverse('watchlist_index'), data={'sort': 'rating'})
+
+    def test_index_cached(self):
+        self.client.get(reverse('watchlist_index'))
+        self.assertBudget(1, reverse('watchlist_index'))
+
+    def test_add_item(self):
+        self.assertBudget(2, reverse('add_watch_item'), 'post', {'title': 'Nueva', 'item_type': 'SERIES'}, status=302)
+
+    def test_toggle(self):
+        self.assertBudget(3, reverse('toggle_watched', args=[self.item.id]), status=302)
+
+    def test_add_review(self):
+        # Includes the savepoints of the locked update and the search index writes
+        self.assertBudget(12, reverse('add_review', args=[self.item.id]), 'post', {'rating': 5, 'comment': 'Genial'}, status=302)
+
+    def test_delete(self):
+        # Grows with the item's own reviews (one search index delete each),
+        # never with the size of the tables
+        self.assertBudget(7, reverse('delete_watch_item', args=[self.item.id]), 'post', status=302)
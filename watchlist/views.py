@@ -1,12 +1,28 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
-from django.contrib.auth.decorators import login_required
+from django.db import transaction
+from django.db.models import Prefetch
 from .models import WatchItem, Review
+from core.cache import conditional, fragment_context
+
+SORT_ORDERS = {
+    'recent': ('is_watched', '-created_at'),
+    'rating': ('is_watched', '-avg_rating', '-review_count', '-created_at'),
+}
 
 @login_required
+@conditional('watchlist', vary_csrf=True)
 def index(request):
-    watchlist = WatchItem.objects.all().order_by('is_watched', '-created_at')
-    return render(request, 'watchlist/index.html', {'watchlist': watchlist})
+    sort = request.GET.get('sort', 'recent')
+    if sort not in SORT_ORDERS:
+        sort = 'recent'
+    # Two queries in total (the items, then all their reviews with authors),
+    # and none while the cached list fragment is current
+    watchlist = WatchItem.objects.order_by(*SORT_ORDERS[sort]).prefetch_related(
+        Prefetch('reviews', queryset=Review.objects.select_related('user').order_by('created_at'))
+    )
+    context = {'watchlist': watchlist, 'sort': sort, **fragment_context(request, 'watchlist')}
+    return render(request, 'watchlist/index.html', context)
 
 @login_required
 def add_item(request):
@@ -39,9 +55,13 @@ def add_review(request, item_id):
     if request.method == 'POST':
         rating = int(request.POST.get('rating', 0))
         comment = request.POST.get('comment', '')
-        # Update or create review (one per user)
-        Review.objects.update_or_create(
-            watch_item=item, user=request.user,
-            defaults={'rating': rating, 'comment': comment}
-        )
+        with transaction.atomic():
+            # Lock the item so concurrent reviews can't interleave the aggregate update
+            item = WatchItem.objects.select_for_update().get(pk=item.pk)
+            # Update or create review (one per user)
+            Review.objects.update_or_create(
+                watch_item=item, user=request.user,
+                defaults={'rating': rating, 'comment': comment}
+            )
+            item.refresh_review_stats()
     return redirect('watchlist_index')